@@ -0,0 +1,30 @@
+"""
+Micro-benchmark of environment construction.
+
+The first construction of each class builds the move tables (the cost every construction used to pay);
+subsequent constructions share them and only allocate a state.
+
+Usage (from the repository root):
+    python -m benchmarks.construction
+"""
+
+import time
+from efficientcube.environments import Cube3, Cube4
+
+def time_construction(env_class, repeats=1000):
+    # first construction: builds the class-level tables
+    time_0 = time.perf_counter()
+    env_class()
+    cold = time.perf_counter() - time_0
+
+    # steady state: tables are shared
+    time_0 = time.perf_counter()
+    for _ in range(repeats):
+        env_class()
+    warm = (time.perf_counter() - time_0) / repeats
+    return cold, warm
+
+if __name__ == '__main__':
+    for env_class in [Cube3, Cube4]:
+        cold, warm = time_construction(env_class)
+        print(f"{env_class.__name__}: first {cold*1e6:9.1f} us | subsequent {warm*1e6:7.2f} us | speed-up x{cold/warm:.0f}")
@@ -0,0 +1,39 @@
+"""
+Scaling benchmark of `ParallelSolver` on a fixed, seeded set of scrambles.
+
+For each number of workers, reports throughput (scrambles/second) and the speed-up over a single worker.
+
+Usage (from the repository root):
+    TQDM_DISABLE=1 python -m benchmarks.parallel --env 4x4 --num-scrambles 32 --beam-width 1024 --workers 1 2 4 8
+"""
+
+import argparse
+import time
+import torch
+from efficientcube import EfficientCube
+from efficientcube.parallel import ParallelSolver
+from benchmarks.precision import generate_scrambles
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--env", default="4x4")
+    parser.add_argument("--num-scrambles", type=int, default=32)
+    parser.add_argument("--scramble-length", type=int, default=1000)
+    parser.add_argument("--beam-width", type=int, default=2**10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--precision", default="fp32")
+    args = parser.parse_args()
+
+    scrambles = generate_scrambles(args.env, args.num_scrambles, args.scramble_length, args.seed)
+    solver = EfficientCube(env=args.env, device=torch.device('cpu'), precision=args.precision)
+    baseline = None
+    for num_workers in args.workers:
+        with ParallelSolver(solver, num_workers=num_workers) as parallel_solver:
+            parallel_solver.solve_many(scrambles[:num_workers], 2) # start up the workers
+            time_0 = time.time()
+            results = parallel_solver.solve_many(scrambles, args.beam_width)
+            throughput = len(scrambles) / (time.time() - time_0)
+        baseline = baseline or throughput
+        success_rate = sum(result is not None for result in results) / len(results)
+        print(f"{num_workers:>3} workers x {parallel_solver.threads_per_worker} threads: {throughput:8.3f} scrambles/s | speed-up x{throughput/baseline:.2f} | success {success_rate:6.1%}")
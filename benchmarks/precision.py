@@ -0,0 +1,52 @@
+"""
+Benchmark of the inference precision modes of `EfficientCube` on a fixed, seeded set of scrambles.
+
+For each mode, reports throughput (nodes/second, over every scramble, solved or not), success rate, and mean solution
+length (over the solved scrambles).
+
+Usage (from the repository root):
+    python -m benchmarks.precision --env 4x4 --num-scrambles 20 --beam-width 1024
+"""
+
+import argparse
+import random
+import time
+import torch
+from efficientcube import EfficientCube
+from efficientcube.environments import load_environment
+
+def generate_scrambles(env_name, num_scrambles, scramble_length, seed):
+    """Seeded random scrambles in the move notation of the environment."""
+    rng = random.Random(seed)
+    moves = load_environment(env_name).moves
+    return [[rng.choice(moves) for _ in range(scramble_length)] for _ in range(num_scrambles)]
+
+def run(solver, scrambles, beam_width):
+    num_nodes, solution_lengths, time_0 = 0, [], time.time()
+    for scramble in scrambles:
+        result = solver.solve_many([scramble], beam_width, report_failures=True)[0] # failed searches still report their nodes
+        num_nodes += result['num_nodes']
+        if result['solutions'] is not None:
+            solution_lengths.append(len(result['solutions']))
+    elapsed = time.time() - time_0
+    return {
+        "nodes_per_second": num_nodes / elapsed,
+        "success_rate": len(solution_lengths) / len(scrambles),
+        "mean_solution_length": sum(solution_lengths) / len(solution_lengths) if solution_lengths else float('nan'),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--env", default="4x4")
+    parser.add_argument("--num-scrambles", type=int, default=20)
+    parser.add_argument("--scramble-length", type=int, default=1000)
+    parser.add_argument("--beam-width", type=int, default=2**10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--precisions", nargs="+", default=["fp32", "bf16", "int8"])
+    args = parser.parse_args()
+
+    scrambles = generate_scrambles(args.env, args.num_scrambles, args.scramble_length, args.seed)
+    for precision in args.precisions:
+        solver = EfficientCube(env=args.env, device=torch.device('cpu'), precision=precision)
+        metrics = run(solver, scrambles, args.beam_width)
+        print(f"{precision:>5}: {metrics['nodes_per_second']:10.0f} nodes/s | success {metrics['success_rate']:6.1%} | mean length {metrics['mean_solution_length']:.1f}")
@@ -0,0 +1,41 @@
+"""
+Micro-benchmark of training-data generation: `Cube4.scrambler` (one move at a time, copied into an array as the
+training notebook does) against `BatchCube4` (thousands of walks at once).
+
+Usage (from the repository root):
+    python -m benchmarks.scrambles --num-walks 10000 --scramble-length 30
+"""
+
+import argparse
+import time
+import numpy as np
+from efficientcube.environments import Cube4, BatchCube4
+
+def time_scrambler(num_scrambles, scramble_length):
+    env = Cube4()
+    generator = env.scrambler(scramble_length)
+    time_0 = time.perf_counter()
+    for _ in range(num_scrambles):
+        X = np.zeros((scramble_length, 96), dtype=int)
+        y = np.zeros((scramble_length,), dtype=int)
+        for j in range(scramble_length):
+            state, last_move = next(generator)
+            X[j, :] = state
+            y[j] = last_move
+    return (time.perf_counter() - time_0) / (num_scrambles * scramble_length)
+
+def time_batch(num_walks, scramble_length):
+    batch_env = BatchCube4(num_walks, seed=0)
+    time_0 = time.perf_counter()
+    batch_env.generate(scramble_length)
+    return (time.perf_counter() - time_0) / (num_walks * scramble_length)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-walks", type=int, default=10000)
+    parser.add_argument("--scramble-length", type=int, default=30)
+    args = parser.parse_args()
+
+    sequential = time_scrambler(args.num_walks // 10, args.scramble_length)
+    batched = time_batch(args.num_walks, args.scramble_length)
+    print(f"scrambler: {sequential*1e6:7.2f} us/sample | BatchCube4: {batched*1e6:7.3f} us/sample | speed-up x{sequential/batched:.0f}")
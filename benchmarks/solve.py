@@ -0,0 +1,107 @@
+"""
+Benchmark of the full solve pipeline, reproducing the results table of the README
+(100 scrambles of 1000 turns, at beam widths 2^11, 2^13 and 2^15).
+
+Scrambles are seeded random walks of `Cube4.scrambler`. For each beam width, and for each stage (reduction, then 3x3),
+reports the success rate, mean solution length (QSTM, rotations excluded), nodes expanded, nodes/second, mean time per
+search depth, and the peak resident memory of the process so far. Nodes and times cover every attempted search,
+failed ones included, so that narrow beams are not judged on the scrambles they happen to solve. The report is written as JSON, so that runs of
+different versions can be compared.
+
+Usage (from the repository root):
+    TQDM_DISABLE=1 python -m benchmarks.solve --num-scrambles 100 --beam-widths 2048 8192 32768 --output results.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import resource
+import sys
+import time
+from contextlib import redirect_stdout
+import numpy as np
+import torch
+from efficientcube import EfficientCube
+from efficientcube.environments import Cube4
+
+def generate_scrambles(num_scrambles, scramble_length, seed):
+    """Seeded scrambles in the slice notation of `Cube4`, drawn by its own scrambler (without redundant moves)."""
+    random.seed(seed)
+    env = Cube4()
+    scrambler = env.scrambler(scramble_length)
+    return [[env.moves[next(scrambler)[1]] for _ in range(scramble_length)] for _ in range(num_scrambles)]
+
+def peak_rss_mb():
+    """Peak resident set size of the process, in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 if sys.platform != "darwin" else 1024**2)
+
+def solve_by_stage(solver, scramble, beam_width):
+    """
+    Solves a 4x4 scramble with the two stages of `EfficientCube.solve`, returning the result of each stage with its
+    elapsed time. A failed stage still has a result (with no `solutions`), and the 3x3 stage is None if not reached.
+    """
+    states = solver.env.scrambled_states([scramble])
+    time_0 = time.time()
+    results1 = solver.reduce_many(states, beam_width, report_failures=True)
+    if results1[0]['solutions'] is None:
+        return [(results1[0], time.time() - time_0), (None, 0.)]
+    time_1 = time.time()
+    results2 = solver.solve_reduced(states, results1, beam_width, report_failures=True)
+    return [(results1[0], time_1 - time_0), (results2[0], time.time() - time_1)]
+
+def summarize(stage_runs):
+    """Metrics of a stage, from its (result, elapsed) runs; nodes and times are those of every run, solved or not."""
+    solved = [result for result, _ in stage_runs if result['solutions'] is not None]
+    elapsed = sum(t for _, t in stage_runs)
+    num_nodes = sum(result['num_nodes'] for result, _ in stage_runs)
+    depth_times = [result['depth_times'] for result, _ in stage_runs]
+    max_depth = max(map(len, depth_times), default=0)
+    return {
+        "num_attempted": len(stage_runs),
+        "success_rate": len(solved) / max(len(stage_runs), 1),
+        "mean_solution_length": float(np.mean([len(result['solutions']) for result in solved])) if solved else None,
+        "mean_num_nodes": num_nodes / len(stage_runs) if stage_runs else None,
+        "nodes_per_second": num_nodes / elapsed if elapsed else None,
+        "total_time": elapsed,
+        "mean_depth_times": [float(np.mean([t[d] for t in depth_times if len(t) > d])) for d in range(max_depth)],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-scrambles", type=int, default=100)
+    parser.add_argument("--scramble-length", type=int, default=1000)
+    parser.add_argument("--beam-widths", type=int, nargs="+", default=[2**11, 2**13, 2**15])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--precision", default="fp32")
+    parser.add_argument("--endgame", default=None, help="Path of a saved 3x3 endgame table")
+    parser.add_argument("--pipeline-chunks", type=int, default=1)
+    parser.add_argument("--num-candidates", type=int, default=1)
+    parser.add_argument("--depth-slack", type=int, default=0)
+    parser.add_argument("--output", default="-", help="JSON report (default: stdout)")
+    args = parser.parse_args()
+
+    scrambles = generate_scrambles(args.num_scrambles, args.scramble_length, args.seed)
+    solver = EfficientCube(env="4x4", precision=args.precision, endgame=args.endgame, pipeline_chunks=args.pipeline_chunks, num_candidates=args.num_candidates, depth_slack=args.depth_slack)
+    report = {
+        "config": vars(args) | {"device": str(solver.device), "torch": torch.__version__, "numpy": np.__version__, "python": platform.python_version()},
+        "results": [],
+    }
+    for beam_width in args.beam_widths:
+        with redirect_stdout(sys.stderr): # keep the progress messages of the search out of the report
+            runs = [solve_by_stage(solver, scramble, beam_width) for scramble in scrambles]
+        stage1 = [run[0] for run in runs]
+        stage2 = [run[1] for run in runs if run[1][0] is not None]
+        lengths = [len(result['reduction']) + len(result['solutions']) for result, _ in stage2 if result['solutions'] is not None]
+        report["results"].append({
+            "beam_width": beam_width,
+            "success_rate": len(lengths) / len(runs),
+            "mean_solution_length": float(np.mean(lengths)) if lengths else None,
+            "reduction": summarize(stage1),
+            "3x3": summarize(stage2),
+        })
+        print(f"beam width {beam_width}: success {report['results'][-1]['success_rate']:.1%} | mean length {report['results'][-1]['mean_solution_length']}", file=sys.stderr)
+
+    with (sys.stdout if args.output == "-" else open(args.output, "w")) as f:
+        json.dump(report, f, indent=2)
@@ -1,7 +1,10 @@
 import os
+import time
+import numpy as np
 import torch
 from .environments import load_environment
-from .model import Model
+from .model import Model, InferenceModel, LongInputs, quantize_model
+from .endgame import EndgameTable
 from . import search
 from .utils import *
 
@@ -11,6 +14,14 @@ class EfficientCube:
         env="4x4",
         model_path="auto",
         device=torch.device('cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu'),
+        inference_model=False,
+        precision="fp32",
+        cache_size=0,
+        endgame=None,
+        pipeline_chunks=1,
+        num_candidates=1,
+        depth_slack=0,
+        verbose=True,
     ):
         """
         Initialize EfficientCube object.
@@ -19,11 +30,21 @@ class EfficientCube:
             env (str): The name of the Rubik's Cube environment.
             model_path (str): Path to the trained model file, or "auto" to use default paths.
             device (torch.device): The device to run the model on (GPU if available, otherwise CPU).
+            inference_model (bool): If True, run the loaded model through its BatchNorm-folded equivalent (`InferenceModel`), which gives the same outputs but was not measured faster.
+            precision (str): "fp32", "bf16" (autocast, also on CPU), or "int8" (dynamically quantized linear layers, CPU only).
+            cache_size (int): If positive, the number of states whose model outputs are kept (`search.PolicyCache`) across searches and solves.
+            endgame (EndgameTable or str): Endgame table of the 3x3 stage (or the path of a saved one, memory-mapped), with which the search finishes as soon as it gets within the table's depth of the goal.
+            pipeline_chunks (int): If above 1, the number of chunks of each beam depth, whose model evaluation overlaps the scoring of the previous chunk (see `search.beam_search_many`).
+            num_candidates (int): Number of distinct reduced states the 4x4 reduction hands over to the 3x3 stage, which searches from all of them at once (each with its own beam width) and keeps the first solved.
+            depth_slack (int): Number of moves past its first reduced state within which the reduction collects the others.
+            verbose (bool): If False, the solves print no progress messages (e.g. when serving requests).
         """
 
         # Set up Rubik's Cube environment
         self.env_name = env
         self.env = load_environment(env)
+        self.device = device
+        self._cube3_solver = None # second-stage solver of the 4x4 pipeline, loaded on first use
         
         # If model_path is set to "auto", use default paths based on the environment
         if model_path.lower().strip()=="auto":
@@ -53,40 +74,170 @@ class EfficientCube:
                     raise ValueError(f"Model could not be loaded from `{model_path}`")
 
         self.model.eval()  # Set the model to evaluation mode (no training)
+        if inference_model:
+            self.model = InferenceModel(self.model).to(device)
+        elif self.env_name != '4x4':
+            self.model = LongInputs(self.model) # exported models may not accept uint8 states
+        self.inference_model = inference_model
 
-    """ Methods defined below are mere routers """
+        # Set up the precision of inference
+        assert precision in ["fp32", "bf16", "int8"], f"Invalid precision `{precision}`"
+        if precision == "int8":
+            assert device.type == "cpu", "int8 inference is only supported on CPU"
+            self.model = quantize_model(self.model)
+        self.precision = precision
 
-    def solve(self, beam_width):
-        # Execute a beam search to find the solution
-        if self.env_name == '4x4':
-            
-            temp_env = Cube4()
-            temp_env.state = self.env.state
+        # Keep the model outputs of recently evaluated states
+        self.cache_size = cache_size
+        self.policy_cache = search.PolicyCache(max_entries=cache_size) if cache_size > 0 else None
 
-            print("Reducing to 3x3...")
-            result1 = search.beam_search(temp_env, self.model, beam_width)
+        # Look up the last moves of the 3x3 stage
+        self.endgame = EndgameTable.load(endgame) if isinstance(endgame, str) else endgame
+        self.pipeline_chunks = pipeline_chunks
 
-            self.env.apply_scramble(result1['solutions'])
+        # Hand several reduced states over to the 3x3 stage
+        self.num_candidates = num_candidates
+        self.depth_slack = depth_slack
+        self.verbose = verbose
 
-            rotations = self.env.reset_rotation()
+    @property
+    def cube3_solver(self):
+        """The 3x3 solver used after reduction, loaded once and kept for the lifetime of this instance."""
+        if self._cube3_solver is None:
+            self._cube3_solver = EfficientCube(env='3x3', device=self.device, inference_model=self.inference_model, precision=self.precision, cache_size=self.cache_size, endgame=self.endgame, pipeline_chunks=self.pipeline_chunks)
+        return self._cube3_solver
 
-            cube3_env = convert_4x4_to_3x3(self.env)
-            cube3_solver = EfficientCube(env='3x3')
-            cube3_solver.env = cube3_env
-            print("Solving 3x3...")
-            result2 = cube3_solver.solve(beam_width)
-            result2['solutions'] = ["1"+move for move in result2['solutions']]
+    """ Methods defined below are mere routers """
 
-            result = result1
-            result['solutions'] += rotations + result2['solutions']
-            result['num_nodes'] += result2['num_nodes']
-            result['times'] += result2['times']
+    def solve(self, beam_width, timeout=None):
+        """
+        Solve the scramble of `self.env`, leaving it solved on success.
+
+        Parameters:
+            beam_width (int or list): Maximum number of candidate paths per depth, or a schedule of increasing widths
+                (e.g. `[2**10, 2**11, ..., 2**15]`) tried in turn until one succeeds. Easy scrambles are solved by the
+                narrow first attempts; on the 4x4, a reduction that succeeded is kept, and only its 3x3 stage is widened.
+                With a `cache_size`, the model outputs of the previous attempts are reused as well.
+            timeout (float): If given, the number of seconds after which the search gives up, returning None unless
+                an attempt has succeeded.
 
-            self.apply_moves_to_env(result['solutions'][0])
+        Returns:
+            dict or None: The result of the search (see `search.beam_search_many`), plus the `beam_width` that found it.
+        """
+        beam_widths = [beam_width] if np.ndim(beam_width) == 0 else list(beam_width)
+        deadline = time.time() + timeout if timeout is not None else None # as a `time.time()` value, as the search takes it
 
+        if self.env_name == '3x3':
+            result = search.beam_search_vectorized(self.env, self.model, beam_widths, device=self.device, precision=self.precision, cache=self.policy_cache, endgame=self.endgame, pipeline_chunks=self.pipeline_chunks, deadline=deadline)
+            if result is not None:
+                self.apply_moves_to_env(result['solutions'])
             return result
-        elif self.env_name == '3x3':
-            return search.beam_search(self.env, self.model, beam_width)
+
+        result1 = None
+        for beam_width in beam_widths:
+            if len(beam_widths) > 1 and self.verbose:
+                print(f"Beam width {beam_width}:")
+            if result1 is None:
+                result1 = self.reduce_many(self.env.state[None, :], beam_width, deadline)[0]
+            if result1 is not None:
+                result = self.join_stages(result1, self.solve_reduced(self.env.state[None, :], [result1], beam_width, deadline)[0])
+                if result is not None:
+                    result['beam_width'] = beam_width
+                    self.apply_moves_to_env(result['solutions'])
+                    return result
+            if deadline is not None and time.time() >= deadline:
+                break
+        return None
+
+    def solve_many(self, scrambles, beam_width, report_failures=False):
+        """
+        Solve many scrambles at once, with the beam searches of all of them sharing every model batch.
+        Each search retires from the batch as soon as it is solved. `self.env` is left untouched.
+
+        Parameters:
+            scrambles (list): Scrambles, each being a string or a list of moves (as in `apply_moves_to_env`).
+            beam_width (int): Maximum number of candidate paths per depth, for each scramble.
+            report_failures (bool): If True, a scramble that is not solved gets a result whose `solutions` are None,
+                with the nodes and time spent on it (see `search.beam_search_many`).
+
+        Returns:
+            list: One result per scramble, with the same fields as the result of `solve`, or None if not solved.
+        """
+        env = load_environment(self.env_name)
+        states = env.scrambled_states(scrambles)
+
+        if self.env_name == '3x3':
+            return search.beam_search_many(env, self.model, states, beam_width, device=self.device, precision=self.precision, cache=self.policy_cache, endgame=self.endgame, pipeline_chunks=self.pipeline_chunks, report_failures=report_failures, verbose=self.verbose)
+
+        results1 = self.reduce_many(states, beam_width, report_failures=report_failures)
+        results2 = self.solve_reduced(states, results1, beam_width, report_failures=report_failures)
+        return [self.join_stages(result1, result2) for result1, result2 in zip(results1, results2)]
+
+    def reduce_many(self, states, beam_width, deadline=None, report_failures=False):
+        """
+        First stage of the 4x4 pipeline: reduces an (N, 96) array of scrambled states to 3x3 cubes.
+        Returns the results of `search.beam_search_many`, with their `candidates` if `num_candidates` is above 1.
+        """
+        if self.verbose:
+            print("Reducing to 3x3...")
+        return search.beam_search_many(self.env, self.model, states, beam_width, device=self.device, precision=self.precision, cache=self.policy_cache, pipeline_chunks=self.pipeline_chunks, num_candidates=self.num_candidates, depth_slack=self.depth_slack, deadline=deadline, report_failures=report_failures, verbose=self.verbose)
+
+    def solve_reduced(self, states, results1, beam_width, deadline=None, report_failures=False):
+        """
+        Second stage of the 4x4 pipeline: solves the reduced states of the reduction `results1` of the scrambled `states`
+        as 3x3 cubes. The reduced states (candidates) of all the scrambles are rotated and converted in one batch, and
+        those of each scramble are the roots of a single 3x3 search, sharing every model batch.
+
+        Returns:
+            list: One 3x3 search result per scramble (None if either stage failed), with its `solutions` in 4x4 notation,
+            and the `reduction` and `rotation` moves that lead to the reduced state it starts from (see `join_stages`).
+            With `report_failures`, a failed 3x3 search has a result with its stats, whose `solutions` are None.
+        """
+        env = self.env
+        results2 = [None] * len(states)
+        searches, candidates = [], []
+        for i, (state, result1) in enumerate(zip(states, results1)):
+            if result1 is not None and result1['solutions'] is not None:
+                for candidate in result1.get('candidates') or [{'solutions': result1['solutions'], 'state': env.batch_apply_scramble(state[None, :], result1['solutions'])[0]}]:
+                    searches.append(i)
+                    candidates.append(candidate)
+        if not candidates:
+            return results2
+
+        # Hand the reduced states over to the 3x3 stage
+        reduced_states = np.array([candidate['state'] for candidate in candidates])
+        cube3_states = batch_convert_4x4_to_3x3(env.batch_standard_orientation(reduced_states)[0])
+        solved_ix, search_groups = np.unique(searches, return_inverse=True)
+
+        if self.verbose:
+            print("Solving 3x3...")
+        cube3_solver = self.cube3_solver
+        cube3_results = search.beam_search_many(cube3_solver.env, cube3_solver.model, cube3_states, beam_width, device=self.device, precision=self.precision, cache=cube3_solver.policy_cache, endgame=cube3_solver.endgame, pipeline_chunks=self.pipeline_chunks, search_groups=search_groups, deadline=deadline, report_failures=report_failures, verbose=self.verbose)
+        for i, result2 in zip(solved_ix, cube3_results):
+            if result2 is not None and result2['solutions'] is not None:
+                candidate = candidates[result2['root']]
+                result2['reduction'] = candidate['solutions']
+                result2['rotation'] = env.reset_state_rotation(candidate['state'])[1]
+                result2['solutions'] = ["1"+move for move in result2['solutions']]
+            results2[i] = result2
+        return results2
+
+    @staticmethod
+    def join_stages(result1, result2):
+        """
+        Result of a whole 4x4 solve, from the results of its two stages: None if either failed, unless the failure
+        was reported (see `solve_many`), in which case the result has the stats of both stages and no `solutions`.
+        """
+        if result1 is None or result1['solutions'] is None:
+            return result1
+        if result2 is None:
+            return None
+        result = {key: value for key, value in result1.items() if key != 'candidates'}
+        result['solutions'] = None if result2['solutions'] is None else result2['reduction'] + result2['rotation'] + result2['solutions']
+        result['num_nodes'] += result2['num_nodes']
+        result['times'] += result2['times']
+        result['depth_times'] = result['depth_times'] + result2['depth_times']
+        return result
 
     def env_is_solved(self):
         return self.env.is_solved()
@@ -0,0 +1,130 @@
+"""
+On-disk training data: scramble trajectories pre-generated into binary shards, served by a memory-mapped `Dataset`.
+
+A shard is a fixed-size header followed by two fixed-record arrays: the uint8 states of every sample, then the uint8
+labels (the move applied to reach each state). Samples are stored trajectory by trajectory, as `BatchCube4.generate`
+produces them. Training then reads blocks of consecutive samples straight from the page cache, without any cube
+simulation, and the same shards can be reused across runs.
+
+Usage (from the repository root):
+    python -m efficientcube.dataset --output data/cube4 --num-shards 8 --scrambles-per-shard 100000 --scramble-length 30
+"""
+
+import glob
+import os
+import numpy as np
+import torch
+from .environments import BatchCube4
+
+MAGIC = b"ECSHARD1"
+HEADER = np.dtype([
+    ("magic", "S8"),
+    ("num_stickers", "<u4"),
+    ("scramble_length", "<u4"),
+    ("num_samples", "<u8"),
+])
+HEADER_SIZE = 64 # bytes reserved for the header, which is padded with zeros
+
+
+def create_shard(path, num_samples, num_stickers, scramble_length):
+    """Creates a shard file of `num_samples` samples, returning its (states, labels) arrays mapped for writing."""
+    header = np.zeros(1, dtype=HEADER)
+    header[0] = (MAGIC, num_stickers, scramble_length, num_samples)
+    with open(path, "wb") as f:
+        f.write(header.tobytes().ljust(HEADER_SIZE, b"\0"))
+        f.truncate(HEADER_SIZE + num_samples * (num_stickers + 1))
+    return _map_shard(path, header[0], "r+")
+
+
+def open_shard(path, mode="c"):
+    """
+    Maps a shard, returning its header and (states, labels) arrays. The default copy-on-write mode gives arrays that
+    torch accepts without a copy, while leaving the file untouched.
+    """
+    header = np.fromfile(path, dtype=HEADER, count=1)[0]
+    assert header["magic"] == MAGIC, f"`{path}` is not a shard"
+    return header, *_map_shard(path, header, mode)
+
+
+def _map_shard(path, header, mode):
+    num_samples, num_stickers = int(header["num_samples"]), int(header["num_stickers"])
+    states = np.memmap(path, dtype=np.uint8, mode=mode, offset=HEADER_SIZE, shape=(num_samples, num_stickers))
+    labels = np.memmap(path, dtype=np.uint8, mode=mode, offset=HEADER_SIZE + num_samples * num_stickers, shape=(num_samples,))
+    return states, labels
+
+
+def generate_shards(output, num_shards, scrambles_per_shard, scramble_length, train=False, seed=0, chunk_size=10000):
+    """
+    Writes `num_shards` shards of random 4x4 scramble trajectories (see `BatchCube4`) to the directory `output`,
+    generating `chunk_size` trajectories at a time. Trajectories start from the solved state, or from random reduced
+    3x3 states if `train` is on. Returns the paths of the shards.
+    """
+    os.makedirs(output, exist_ok=True)
+    batch_env = BatchCube4(chunk_size, seed=seed)
+    paths = []
+    for shard in range(num_shards):
+        path = os.path.join(output, f"shard_{shard:05d}.bin")
+        states, labels = create_shard(path, scrambles_per_shard * scramble_length, len(batch_env.env.goal), scramble_length)
+        for start in range(0, scrambles_per_shard, chunk_size):
+            num_walks = min(chunk_size, scrambles_per_shard - start)
+            X, y = batch_env.generate(scramble_length, train=train)
+            X, y = X[:num_walks], y[:num_walks]
+            states[start*scramble_length:(start+num_walks)*scramble_length] = X.reshape(-1, X.shape[-1])
+            labels[start*scramble_length:(start+num_walks)*scramble_length] = y.ravel()
+        states.flush()
+        labels.flush()
+        paths.append(path)
+    return paths
+
+
+class ShardDataset(torch.utils.data.Dataset):
+    """
+    Memory-mapped shards, served as blocks of `block_size` consecutive samples.
+
+    Each item is a whole batch: an (n, num_stickers) uint8 tensor of states viewing the mapped file (no copy), and
+    the n labels as int64 for the loss. Shuffling happens at the level of blocks, e.g. with
+    `torch.utils.data.DataLoader(dataset, batch_size=None, shuffle=True)`, so that every read is sequential.
+    A `block_size` multiple of the scramble length keeps whole trajectories together, as the training notebook does.
+
+    Args:
+        paths (str or list): Shard files, or a directory of them.
+        block_size (int, optional): Number of samples per item. Defaults to 30000 (1000 trajectories of 30 moves).
+    """
+    def __init__(self, paths, block_size=30000):
+        if isinstance(paths, str):
+            paths = sorted(glob.glob(os.path.join(paths, "*.bin"))) if os.path.isdir(paths) else [paths]
+        self.shards = [open_shard(path) for path in paths]
+        self.block_size = block_size
+        # (shard, first sample) of every block
+        self.blocks = [
+            (shard, start)
+            for shard, (header, _, _) in enumerate(self.shards)
+            for start in range(0, int(header["num_samples"]), block_size)
+        ]
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __getitem__(self, i):
+        shard, start = self.blocks[i]
+        _, states, labels = self.shards[shard]
+        stop = start + self.block_size
+        return torch.from_numpy(states[start:stop]), torch.from_numpy(labels[start:stop].astype(np.int64))
+
+
+if __name__=="__main__":
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--num-shards", type=int, default=8)
+    parser.add_argument("--scrambles-per-shard", type=int, default=100000)
+    parser.add_argument("--scramble-length", type=int, default=30)
+    parser.add_argument("--train", action="store_true", help="Start from random reduced 3x3 states")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    time_0 = time.time()
+    paths = generate_shards(args.output, args.num_shards, args.scrambles_per_shard, args.scramble_length, args.train, args.seed)
+    num_samples = args.num_shards * args.scrambles_per_shard * args.scramble_length
+    print(f"{num_samples} samples written to {len(paths)} shards in {time.time()-time_0:.1f}s")
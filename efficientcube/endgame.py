@@ -0,0 +1,148 @@
+"""
+Exact endgame lookup table for the 3x3 Rubik's Cube.
+
+Every state within `depth` quarter-turns of the goal is enumerated by breadth-first search and stored as a packed key
+(see `utils.pack_states`) with its optimal solution (suffix). Keys are kept sorted, so that a lookup is a binary search,
+and a saved table is memory-mapped rather than read into memory.
+"""
+
+import os
+import numpy as np
+from .environments import Cube3
+from .utils import pack_states
+
+NO_MOVE = 255 # padding of the suffixes shorter than the depth of the table
+
+
+class EndgameTable:
+    """
+    Sorted table of the states within `depth` moves of the goal, with their optimal suffixes.
+
+    Args:
+        keys (np.ndarray): Sorted packed states, as a 1D array of fixed-size bytes (`np.void`).
+        suffixes (np.ndarray): (num_keys, depth) uint8 array of move indices solving each state, padded with `NO_MOVE`.
+    """
+    def __init__(self, keys, suffixes):
+        self.keys = keys
+        self.suffixes = suffixes
+        self.depth = suffixes.shape[1]
+        self.path = None # set on memory-mapped tables
+
+    def __reduce__(self):
+        # a memory-mapped table is reopened by path in other processes, rather than copied
+        if self.path is not None:
+            return (EndgameTable.load, (self.path,))
+        return (EndgameTable, (self.keys, self.suffixes))
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def build(cls, env=None, depth=6, chunk_size=2**16):
+        """
+        Enumerates the states within `depth` quarter-turns of `env.goal` (the 3x3 goal by default).
+        Each state first reached at depth d is solved by the inverse of the move that reached it, followed by
+        the suffix of its parent, which makes every suffix optimal. About 1e6 states are within 6 moves, and 9e6 within 7.
+        """
+        env = env or Cube3()
+        assert env.__class__.__name__ == 'Cube3', "The goal must be a single state"
+        num_moves = len(env.moves)
+        inverse = np.array([env.moves.index(m[:-1] if m.endswith("'") else m + "'") for m in env.moves])
+
+        frontier = env.goal[None, :].copy()
+        seen = _as_keys(pack_states(frontier))
+        levels_keys, levels_suffixes = [seen], [np.full((1, depth), NO_MOVE, dtype=np.uint8)]
+        for _ in range(depth):
+            new_keys, new_suffixes, new_states = [], [], []
+            for start in range(0, len(frontier), chunk_size):
+                parents = frontier[start:start+chunk_size]
+                parent_suffixes = levels_suffixes[-1][start:start+chunk_size]
+                children = parents[:, env.move_perms].reshape(-1, len(env.goal)) # (parent, move) order
+                keys, first = np.unique(_as_keys(pack_states(children)), return_index=True)
+                new = ~_isin_sorted(keys, seen)
+                keys, first = keys[new], first[new]
+                parent, move = np.divmod(first, num_moves)
+                suffixes = np.full((len(first), depth), NO_MOVE, dtype=np.uint8)
+                suffixes[:, 0] = inverse[move]
+                suffixes[:, 1:] = parent_suffixes[parent, :-1]
+                new_keys.append(keys)
+                new_suffixes.append(suffixes)
+                new_states.append(children[first])
+
+            # a state may be reached from parents in different chunks
+            keys, first = np.unique(np.concatenate(new_keys), return_index=True)
+            levels_keys.append(keys)
+            levels_suffixes.append(np.concatenate(new_suffixes)[first])
+            frontier = np.concatenate(new_states)[first]
+            seen = np.sort(np.concatenate([seen, keys]))
+
+        keys = np.concatenate(levels_keys)
+        order = np.argsort(keys)
+        return cls(keys[order], np.concatenate(levels_suffixes)[order])
+
+    def save(self, path):
+        """Saves the table to the directory `path`, as `keys.npy` and `suffixes.npy`."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "keys.npy"), self.keys)
+        np.save(os.path.join(path, "suffixes.npy"), self.suffixes)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Loads a table saved with `save`, memory-mapped (read-only) unless `mmap` is False."""
+        mmap_mode = "r" if mmap else None
+        table = cls(
+            np.load(os.path.join(path, "keys.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, "suffixes.npy"), mmap_mode=mmap_mode),
+        )
+        if mmap:
+            table.path = path
+        return table
+
+    def lookup(self, states):
+        """
+        Looks up an (N, num_stickers) array of states.
+        Returns the mask of the states found, and the length of their suffixes (-1 where not found).
+        Use `suffix` to read the moves of a state found.
+        """
+        keys = _as_keys(pack_states(states))
+        ix = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[ix] == keys
+        lengths = np.full(len(states), -1)
+        if found.any():
+            lengths[found] = np.count_nonzero(self.suffixes[ix[found]] != NO_MOVE, axis=1)
+        return found, lengths
+
+    def suffix(self, state):
+        """Move indices solving `state`, or None if it is not in the table."""
+        key = _as_keys(pack_states(state[None, :]))
+        i = min(int(np.searchsorted(self.keys, key)[0]), len(self.keys) - 1)
+        if self.keys[i] != key[0]:
+            return None
+        suffix = np.asarray(self.suffixes[i])
+        return [int(m) for m in suffix[suffix != NO_MOVE]]
+
+
+def _as_keys(packed):
+    """Views rows of packed states as fixed-size byte strings, which sort and compare as a whole."""
+    packed = np.ascontiguousarray(packed)
+    return packed.view(np.dtype((np.void, packed.shape[-1]))).ravel()
+
+
+def _isin_sorted(keys, sorted_keys):
+    """Membership of `keys` in the sorted array `sorted_keys`."""
+    ix = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return sorted_keys[ix] == keys
+
+
+if __name__=="__main__":
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description="Builds the 3x3 endgame table.")
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "cube3_endgame"))
+    args = parser.parse_args()
+
+    time_0 = time.time()
+    table = EndgameTable.build(depth=args.depth)
+    table.save(args.output)
+    print(f"{len(table)} states within {args.depth} moves, built in {time.time()-time_0:.1f}s and saved to `{args.output}`")
@@ -7,24 +7,40 @@ Please note that we prioritize readability and reproducibility over speed optimi
 """
 
 import random
+import re
 import numpy as np
 
 
 class Cube4:
 
     def __init__(self):
-        self.DTYPE = np.int64
+        # Move tables are built once per process and shared (read-only) by every instance,
+        # so that a new environment only costs the allocation of its state.
+        if "sticker_target_ix" not in Cube4.__dict__:
+            Cube4.__build_tables()
         self.reset()
-        self.goal = np.arange(0, 16 * 6, dtype=self.DTYPE) // 16
+
+    def __setstate__(self, state):
+        # Unpickling skips `__init__`, so a fresh (e.g. spawned) process must build the tables here
+        if "sticker_target_ix" not in Cube4.__dict__:
+            Cube4.__build_tables()
+        self.__dict__.update(state)
+
+    @classmethod
+    def __build_tables(cls):
+        """Defines the moves, rotations and their lookup tables as class attributes."""
+        cls.DTYPE = np.uint8 # colors 0..5; compact states are cheaper to copy, gather and hash
+        cls.goal = np.arange(0, 16 * 6, dtype=cls.DTYPE) // 16
+        cls.goal.flags.writeable = False
 
         faces = ["U", "D", "L", "R", "B", "F"]
         degrees = ["", "'"]
         widths = ["1", "2"]
         degrees_inference = degrees[::-1]
-        self.moves = [f"{w}{f}{n}" for w in widths for f in faces for n in degrees]
-        self.moves_inference = [f"{w}{f}{n}" for w in widths for f in faces for n in degrees_inference]
+        cls.moves = [f"{w}{f}{n}" for w in widths for f in faces for n in degrees]
+        cls.moves_inference = [f"{w}{f}{n}" for w in widths for f in faces for n in degrees_inference]
 
-        self.pairing = {
+        cls.pairing = {
             "R": "L",
             "L": "R",
             "F": "B",
@@ -32,28 +48,30 @@ class Cube4:
             "U": "D",
             "D": "U",
         }
-        self.rotations = {
+        cls.rotations = {
             'x': "1R 2R 1L' 2L'",
             'y': "1U 2U 1D' 2D'",
             'z': "1F 2F 1B' 2B'"
         }
-        self.rotation_scrambles = [i + " " + j for i in ["", "1L 2L 1R' 2R'", "1L 2L 1R' 2R' 1L 2L 1R' 2R'", "1L' 2L' 1R 2R", "1U 2U 1D' 2D'", "1U' 2U' 1D 2D"] for j in ["", "1F 2F 1B' 2B'", "1F 2F 1B' 2B' 1F 2F 1B' 2B'", "1F' 2F' 1B 2B"]]
+        # Notation tokens: slice moves (1R, 2R'), WCA outer and wide moves (R, Rw'), and rotations (x), with an optional half-turn
+        cls.token_pattern = re.compile(r"(?:[12]?[UDLRBF]|[UDLRBF]w|[xyz])['2]?")
+        cls.rotation_scrambles = [i + " " + j for i in ["", "1L 2L 1R' 2R'", "1L 2L 1R' 2R' 1L 2L 1R' 2R'", "1L' 2L' 1R 2R", "1U 2U 1D' 2D'", "1U' 2U' 1D 2D"] for j in ["", "1F 2F 1B' 2B'", "1F 2F 1B' 2B' 1F 2F 1B' 2B'", "1F' 2F' 1B 2B"]]
 
         # Prohibit obviously redundant moves.
-        self.moves_available_after = {
-            m: [v for v in self.moves if v[1] != m[1]] + [m]
-            for m in self.moves
+        cls.moves_available_after = {
+            m: [v for v in cls.moves if v[1] != m[1]] + [m]
+            for m in cls.moves
         } # self-cancelling moves on the same face
 
         # [OPTIMIZATION] slicing by move string (e.g., R', U, F) => indices (e.g., 2, 6, 1)
-        self.moves_ix = [self.moves.index(m) for m in self.moves]
-        self.moves_ix_available_after = {
-            self.moves.index(m): [self.moves.index(m) for m in available_moves]
-            for m, available_moves in self.moves_available_after.items()
+        cls.moves_ix = [cls.moves.index(m) for m in cls.moves]
+        cls.moves_ix_available_after = {
+            cls.moves.index(m): [cls.moves.index(m) for m in available_moves]
+            for m, available_moves in cls.moves_available_after.items()
         }
 
-        self.moves_ix_inference = [self.moves.index(m) for m in self.moves_inference]
-        self.pairing_ix = {
+        cls.moves_ix_inference = [cls.moves.index(m) for m in cls.moves_inference]
+        cls.pairing_ix = {
             0: 1,
             1: 0,
             2: 3,
@@ -63,7 +81,15 @@ class Cube4:
         } # Points to the opposite face index
 
         # Vectorize the sticker group replacement operations
-        self.__vectorize_moves()
+        cls.__vectorize_moves()
+        cls.sticker_target_ix.flags.writeable = False
+        cls.sticker_source_ix.flags.writeable = False
+        cls.move_perms.flags.writeable = False
+
+        # Compiled move algebra: notation token => sticker permutation (see `compile_scramble`)
+        cls.token_perms = {}
+        cls.rotation_perms = np.array([cls.compile_scramble(scramble) for scramble in cls.rotation_scrambles])
+        cls.rotation_perms.flags.writeable = False
 
     def __str__(self):
         """Returns a string representation of the cube."""
@@ -94,9 +120,61 @@ class Cube4:
       """Resets the cube to the solved state. If train mode is on, then solved states are defined as reduced 3x3 states. """
       self.state = np.arange(0, 16 * 6, dtype=self.DTYPE) // 16
       if train:
-        self.scramble_corners()
-        self.scramble_edges(paired=True)
-        self.rotate_randomly()
+        self.state = self.sample_reduced_states(1)[0]
+
+    def sample_reduced_states(self, num_states, rng=None):
+        """
+        Vectorized counterpart of `scramble_corners`, `scramble_edges(paired=True)` and `rotate_randomly`:
+        draws an (N, 96) array of random reduced 3x3 states, randomly rotated. Instead of rejection sampling,
+        the corner, edge and permutation parities are made 0 by construction, fixing the states whose parity is off
+        with a corner twist, an edge swap and an edge flip respectively.
+
+        Args:
+            rng (np.random.Generator, optional): Source of randomness. Defaults to the global `np.random`.
+        """
+        rng = rng or np.random
+        rows = np.arange(num_states)
+        states = np.tile(self.goal, (num_states, 1))
+
+        def randint(high, size):
+            return (rng.random(size) * high).astype(np.int64)
+
+        def roll(colors, shift):
+            """`np.roll` of the colors of each piece (along the last axis) by `shift`."""
+            ix = (np.arange(colors.shape[-1]) - shift[..., None]) % colors.shape[-1]
+            return np.take_along_axis(colors, ix, axis=-1)
+
+        # corners: random twists and permutation; twisting a random corner cancels the corner parity
+        # (same ccw color order as in `scramble_corners`, where the twist of a corner is the index of its white/yellow sticker)
+        colors = np.array([[0, 1, 2], [0, 2, 3], [5, 2, 1], [5, 3, 2], [0, 4, 1], [0, 3, 4], [5, 1, 4], [5, 4, 3]], dtype=self.DTYPE)
+        colors = roll(colors[np.argsort(rng.random((num_states, 8)), axis=1)], randint(3, (num_states, 8)))
+        parity = np.argmax(colors % 5 == 0, axis=-1).sum(axis=-1) % 3
+        corner = randint(8, num_states)
+        colors[rows, corner] = roll(colors[rows, corner], parity * 2 % 3)
+        states[:, self.corner_indices] = colors
+
+        # edge pairs: random flips and permutation, both stickers of a pair being set alike
+        slots = self.edge_indices[self.edge_pairs[:, 0]]
+        partners = self.edge_indices[self.edge_pairs[:, 1]]
+        colors = np.array([[0, 1], [0, 2], [0, 3], [0, 4], [1, 2], [1, 4], [1, 5], [2, 3], [2, 5], [3, 4], [3, 5], [4, 5]], dtype=self.DTYPE)
+        colors = roll(colors[np.argsort(rng.random((num_states, 12)), axis=1)], randint(2, (num_states, 12)))
+        states[:, slots] = states[:, partners] = colors
+
+        # an odd permutation (corners and edges) is made even by swapping two random edge pairs
+        odd = np.flatnonzero(self.batch_permutation_parity(states) == 1)
+        a = randint(12, len(odd))
+        b = (a + 1 + randint(11, len(odd))) % 12
+        colors[odd, a], colors[odd, b] = colors[odd, b], colors[odd, a]
+        states[:, slots] = states[:, partners] = colors
+
+        # then the edge parity is cancelled by flipping a random edge pair
+        odd = np.flatnonzero(self.batch_paired_edge_parity(states) == 1)
+        edge = randint(12, len(odd))
+        colors[odd, edge] = colors[odd, edge, ::-1]
+        states[:, slots] = states[:, partners] = colors
+
+        # random rotation
+        return np.take_along_axis(states, self.rotation_perms[randint(len(self.rotation_perms), num_states)], axis=1)
 
     def is_solved(self):
         """Checks if the cube is in the solved state."""
@@ -183,7 +261,7 @@ class Cube4:
     def rotate_randomly(self):
         """Randomly rotates the cube."""
         i = np.random.randint(len(self.rotation_scrambles))
-        self.apply_scramble(self.rotation_scrambles[i])
+        self.state[:] = self.state[self.rotation_perms[i]]
 
     def corner_parity(self):
         """Computes the corner parity of the cube."""
@@ -234,42 +312,29 @@ class Cube4:
 
     def reset_rotation(self):
         """Resets the cube's rotation to the default orientation (white on top, green at front)"""
+        self.state[:], rotations = self.reset_state_rotation(self.state)
+        return rotations
+
+    @classmethod
+    def reset_state_rotation(cls, state):
+        """Out-of-place `reset_rotation` on a single state. Returns the rotated state and the rotations applied."""
         rotations = []
 
-        if self.state[5] == 2:
-            [self.apply_scramble(self.rotations['x']) for _ in range(3)]
-            rotations.append("x'")
-        if self.state[21] == 2:
-            [self.apply_scramble(self.rotations['y']) for _ in range(3)]
-            rotations.append("y'")
-        if self.state[53] == 2:
-            self.apply_scramble(self.rotations['y'])
-            rotations.append("y")
-        if self.state[69] == 2:
-            [self.apply_scramble(self.rotations['y']) for _ in range(2)]
-            rotations.append("y2")
-        if self.state[85] == 2:
-            self.apply_scramble(self.rotations['x'])
-            rotations.append("x")
-
-        if self.state[21] == 0:
-            self.apply_scramble(self.rotations['z'])
-            rotations.append("z")
-        if self.state[53] == 0:
-            [self.apply_scramble(self.rotations['z']) for _ in range(3)]
-            rotations.append("z'")
-        if self.state[85] == 0:
-            [self.apply_scramble(self.rotations['z']) for _ in range(2)]
-            rotations.append("z2")
-        
+        # green to the front, then white on top; each rotation is a single precomputed permutation
+        for center, rotation in [(5, "x'"), (21, "y'"), (53, "y"), (69, "y2"), (85, "x")]:
+            if state[center] == 2:
+                state = state[cls.token_permutation(rotation)]
+                rotations.append(rotation)
+        for center, rotation in [(21, "z"), (53, "z'"), (85, "z2")]:
+            if state[center] == 0:
+                state = state[cls.token_permutation(rotation)]
+                rotations.append(rotation)
 
-        return rotations
+        return state, rotations
 
     def permutation_parity(self):
         """Computes the permutation parity of the cube."""
-        temp_cube = Cube4()
-        temp_cube.state = self.state
-        temp_cube.reset_rotation()
+        oriented_state = self.reset_state_rotation(self.state)[0]
 
         parity = 0
 
@@ -290,7 +355,7 @@ class Cube4:
         g = []
 
         for i in range(8):
-            piece_colors = tuple(sorted([temp_cube.state[indices[i][j]] for j in range(3)]))
+            piece_colors = tuple(sorted([oriented_state[indices[i][j]] for j in range(3)]))
             g.append(corner_index_from_colors[piece_colors])
 
         v = [False for _ in range(8)]
@@ -324,7 +389,7 @@ class Cube4:
         g = []
 
         for i in range(12):
-            piece_colors = tuple(sorted([temp_cube.state[indices[edge_pairs[i][0]][j]] for j in range(2)]))
+            piece_colors = tuple(sorted([oriented_state[indices[edge_pairs[i][0]][j]] for j in range(2)]))
             g.append(edge_pair_index_from_colors[piece_colors])
 
         v = [False for _ in range(12)]
@@ -339,14 +404,113 @@ class Cube4:
 
         return parity % 2
 
+    """ Batch versions of the checks above, taking an (N, 96) array of states and returning vectors """
+
+    center_indices = np.array([5, 6, 9, 10, 21, 22, 25, 26, 37, 38, 41, 42, 53, 54, 57, 58, 69, 70, 73, 74, 85, 86, 89, 90])
+    edge_indices = np.array([[13, 33], [14, 34], [23, 36], [39, 52], [27, 40], [43, 56], [45, 81], [46, 82], [8, 18], [11, 49], [30, 84], [61, 87], [4, 17], [7, 50], [29, 88], [62, 91], [66, 1], [65, 2], [68, 55], [71, 20], [72, 59], [75, 24], [78, 93], [77, 94]])
+    edge_pairs = np.array([[0, 1], [2, 4], [3, 5], [6, 7], [8, 12], [9, 13], [10, 14], [11, 15], [16, 17], [18, 20], [19, 21], [22, 23]])
+    corner_indices = np.array([[12, 19, 32], [15, 35, 48], [80, 44, 31], [83, 60, 47],
+                               [0, 67, 16], [3, 51, 64], [92, 28, 79], [95, 76, 63]])
+
+    def batch_is_solved(self, states):
+        """Batch version of `is_solved`."""
+        return (
+            self.batch_are_centers_solved(states) & self.batch_are_edges_solved(states)
+            & (self.batch_paired_edge_parity(states) == 0) & (self.batch_permutation_parity(states) == 0)
+        )
+
+    def batch_are_centers_solved(self, states):
+        """Batch version of `are_centers_solved`."""
+        centers = states[:, self.center_indices].reshape(-1, 6, 4)
+        return np.all(centers == centers[:, :, :1], axis=(1, 2))
+
+    def batch_are_edges_solved(self, states):
+        """Batch version of `are_edges_solved`."""
+        edges = self.edge_indices[self.edge_pairs] # (12 pairs, 2 edges, 2 stickers)
+        return np.all(states[:, edges[:, 0]] == states[:, edges[:, 1]], axis=(1, 2))
+
+    def batch_corner_parity(self, states):
+        """Batch version of `corner_parity`."""
+        colors = states[:, self.corner_indices]
+        return np.argmax(colors % 5 == 0, axis=-1).sum(axis=-1) % 3
+
+    def batch_paired_edge_parity(self, states):
+        """Batch version of `paired_edge_parity`, without asserting that edges are paired."""
+        # U/D-layer and E-slice edges, with the same sticker selection as `paired_edge_parity`
+        edges = self.edge_indices[self.edge_pairs[[0, 3, 4, 5, 6, 7, 8, 11], 0]]
+        on_u_or_d = (edges[:, 0] <= 15) | (edges[:, 0] >= 80)
+        X, YZ = np.where(on_u_or_d, edges[:, 0], edges[:, 1]), np.where(on_u_or_d, edges[:, 1], edges[:, 0])
+        X, YZ = states[:, X], states[:, YZ]
+        parity = (X % 5 == 0) | (((X == 1) | (X == 3)) & ((YZ == 2) | (YZ == 4)))
+
+        edges = self.edge_indices[self.edge_pairs[[1, 2, 9, 10], 0]]
+        on_f_or_b = ((edges[:, 0] >= 32) & (edges[:, 0] <= 47)) | ((edges[:, 0] >= 64) & (edges[:, 0] <= 79))
+        Y, Z = np.where(on_f_or_b, edges[:, 0], edges[:, 1]), np.where(on_f_or_b, edges[:, 1], edges[:, 0])
+        Y, Z = states[:, Y], states[:, Z]
+        parity = np.concatenate([parity, (Z % 5 == 0) | (Y == 2) | (Y == 4)], axis=1)
+
+        return parity.sum(axis=1) % 2
+
+    def batch_permutation_parity(self, states):
+        """
+        Batch version of `permutation_parity`.
+        Each state is brought to the default orientation through precomputed rotation permutations,
+        and the parity of the corner and edge-pair permutations is obtained by counting inversions.
+        Only meaningful for states whose centers are solved and edges are paired.
+        """
+        states = self.batch_standard_orientation(states)[0]
+
+        # piece index from the set of its colors, encoded as a bitmask (same pieces as in `permutation_parity`)
+        corner_index_from_colors = np.full(64, -1)
+        corner_index_from_colors[[
+            sum(1 << c for c in colors)
+            for colors in [(0, 1, 2), (0, 2, 3), (1, 2, 5), (2, 3, 5), (0, 1, 4), (0, 3, 4), (1, 4, 5), (3, 4, 5)]
+        ]] = np.arange(8)
+        edge_pair_index_from_colors = np.full(64, -1)
+        edge_pair_index_from_colors[[
+            sum(1 << c for c in colors)
+            for colors in [(0, 2), (1, 2), (2, 3), (2, 5), (0, 1), (0, 3), (1, 5), (3, 5), (0, 4), (3, 4), (1, 4), (4, 5)]
+        ]] = np.arange(12)
+
+        corners = corner_index_from_colors[np.sum(1 << states[:, self.corner_indices], axis=-1)]
+        edges = edge_pair_index_from_colors[np.sum(1 << states[:, self.edge_indices[self.edge_pairs[:, 0]]], axis=-1)]
+
+        # the parity of a permutation is that of its number of inversions
+        parity = 0
+        for g in [corners, edges]:
+            parity += np.triu(g[:, :, None] > g[:, None, :], k=1).sum(axis=(1, 2))
+        return parity % 2
+
+    def batch_standard_orientation(self, states):
+        """
+        Rotates an (N, 96) array of states with solved centers to the default orientation (white on top, green at front),
+        as `reset_rotation` does. Returns the rotated states and the index of the rotation used (in `rotation_perms`).
+        """
+        centers = states[:, self.rotation_perms[:, [5, 37]]] # (N, 24, 2): top and front centers of every rotated image
+        rotation = np.argmax((centers[:, :, 0] == 0) & (centers[:, :, 1] == 2), axis=1)
+        return np.take_along_axis(states, self.rotation_perms[rotation], axis=1), rotation
+
+    def batch_canonical_orientation(self, states):
+        """
+        Orientation-canonical form of an (N, 96) array of states: the lexicographically smallest of their 24 rotated
+        images. Since the 4x4 has no fixed centers, states equal up to a rotation share it, which makes it a key
+        for orientation-insensitive caching and deduplication.
+        Returns the canonical states and the index of the rotation used (in `rotation_perms`).
+        """
+        # narrow down the smallest images sticker by sticker, gathering one column of the 24 images at a time
+        smallest = np.ones((len(states), len(self.rotation_perms)), dtype=bool)
+        for j in range(states.shape[1]):
+            column = np.where(smallest, states[:, self.rotation_perms[:, j]], 6)
+            smallest &= column == column.min(axis=1, keepdims=True)
+            if np.all(smallest.sum(axis=1) == 1):
+                break
+        rotation = np.argmax(smallest, axis=1)
+        return np.take_along_axis(states, self.rotation_perms[rotation], axis=1), rotation
+
     def finger(self, move):
         """Applies a single move on the cube state using move string."""
         if move[0] in self.rotations:
-            if move[-1] == "'":
-                for _ in range(3):
-                    self.apply_scramble(self.rotations[move[0]])
-            else:
-                self.apply_scramble(self.rotations[move])
+            self.state[:] = self.state[self.token_permutation(move)]
             return
         self.state[self.sticker_target[move]] = self.state[self.sticker_source[move]]
 
@@ -355,35 +519,71 @@ class Cube4:
         self.state[self.sticker_target_ix[ix]] = self.state[self.sticker_source_ix[ix]]
 
     def apply_scramble(self, scramble):
-        """Applies a sequence of moves (scramble) to the cube state."""
+        """Applies a sequence of moves (scramble) to the cube state, with a single gather (see `compile_scramble`)."""
+        self.state[:] = self.state[self.compile_scramble(scramble)]
+
+    def batch_apply_scramble(self, states, scramble):
+        """Applies the same scramble to every row of an (N, 96) array of states, returning the new states."""
+        return states[:, self.compile_scramble(scramble)]
+
+    def scrambled_states(self, scrambles):
+        """Returns the (N, 96) array of states reached by applying each of the given scrambles to the solved cube."""
+        return self.goal[np.array([self.compile_scramble(scramble) for scramble in scrambles]).reshape(-1, 16 * 6)]
+
+    @classmethod
+    def compile_scramble(cls, scramble):
+        """
+        Compiles a sequence of moves into a single sticker permutation `perm`, such that `state[perm]` is the state
+        after the sequence. Accepts the notations of `apply_scramble`: slice moves (1R, 2R'), WCA outer and wide moves
+        (R, Rw', Fw2), half-turns, and rotations (x, y', z2).
+        """
         if isinstance(scramble, str):
             scramble = scramble.split()
+        perm = np.arange(16 * 6)
+        for token in scramble:
+            perm = perm[cls.token_permutation(token)]
+        return perm
 
-        scramble2 = []
-        for i in range(len(scramble)):
-            a = ""
-            if scramble[i][0].isdigit() or scramble[i][0] in self.rotations:
-              a += scramble[i]
-              scramble2.append(a)
-              continue
-            if "w" in scramble[i]:
-                a += "2"
-            else:
-                a += "1"
-            a += scramble[i][0]
-            if scramble[i][-1] == "'":
-                a += "'"
-            elif scramble[i][-1] == "2":
-                a += "2"
-            scramble2.append(a)
-            if a[0] == "2":
-                scramble2.append("1" + a[1:])
-        for m in scramble2:
-            if m[-1]=='2':
-                for _ in range(2):
-                    self.finger(m[:-1])
+    @classmethod
+    def parse_token(cls, token):
+        """
+        Validates a notation token against `token_pattern`, raising a `ValueError` otherwise, and returns its canonical
+        form, in which an outer-layer move is written as a slice move (e.g. R2 => 1R2).
+        """
+        if not isinstance(token, str) or not cls.token_pattern.fullmatch(token):
+            raise ValueError(f"Invalid move `{token}`")
+        if token[0] in cls.pairing and "w" not in token:
+            return "1" + token
+        return token
+
+    @classmethod
+    def token_permutation(cls, token):
+        """Sticker permutation of a single notation token, computed once per canonical token (see `parse_token`) and cached."""
+        token = cls.parse_token(token)
+        if token not in cls.token_perms:
+            # WCA notation => slice moves (a wide move turns both the inner slice and the outer layer)
+            if "w" in token:
+                a = "2" + token.replace("w", "")
+                slice_moves = [a, "1" + a[1:]]
             else:
-                    self.finger(m)
+                slice_moves = [token]
+
+            perm = np.arange(16 * 6)
+            for m in slice_moves:
+                repeats = 1
+                if m[-1] == "2": # half-turn
+                    m, repeats = m[:-1], 2
+                if m[0] in cls.rotations: # rotations are sequences of quarter-turns of every slice
+                    m_perm = cls.compile_scramble(cls.rotations[m[0]])
+                    if m[-1] == "'":
+                        m_perm = m_perm[m_perm][m_perm]
+                else:
+                    m_perm = cls.move_perms[cls.moves.index(m)]
+                for _ in range(repeats):
+                    perm = perm[m_perm]
+            perm.flags.writeable = False
+            cls.token_perms[token] = perm
+        return cls.token_perms[token]
 
     def scrambler(self, scramble_length):
         """
@@ -432,15 +632,16 @@ class Cube4:
                 yield self.state, move
 
 
-    def __vectorize_moves(self):
+    @classmethod
+    def __vectorize_moves(cls):
         """
         Vectorizes the sticker group replacement operations for faster computation.
-        This method defines ```self.sticker_target``` and ```self.sticker_source``` to manage sticker colors (target is replaced by source).
+        This method defines ```cls.sticker_target``` and ```cls.sticker_source``` to manage sticker colors (target is replaced by source).
         They define indices of target and source stickers so that the moves can be vectorized.
         """
-        self.sticker_target, self.sticker_source = dict(), dict()
+        cls.sticker_target, cls.sticker_source = dict(), dict()
 
-        self.sticker_replacement = {
+        cls.sticker_replacement = {
             # Sticker A is replaced by another sticker at index B -> A:B
             '1U':{0: 12, 1: 8, 2: 4, 3: 0, 4: 13, 5: 9, 6: 5, 7: 1, 8: 14, 9: 10, 10: 6, 11: 2, 12: 15, 13: 11, 14: 7, 15: 3, 16: 32, 17: 33, 18: 34, 19: 35, 32: 48, 33: 49, 34: 50, 35: 51, 48: 64, 49: 65, 50: 66, 51: 67, 64: 16, 65: 17, 66: 18, 67: 19},
             '1D':{83: 80, 87: 81, 91: 82, 95: 83, 82: 84, 86: 85, 90: 86, 94: 87, 81: 88, 85: 89, 89: 90, 93: 91, 80: 92, 84: 93, 88: 94, 92: 95, 44: 28, 45: 29, 46: 30, 47: 31, 60: 44, 61: 45, 62: 46, 63: 47, 76: 60, 77: 61, 78: 62, 79: 63, 28: 76, 29: 77, 30: 78, 31: 79},
@@ -455,31 +656,101 @@ class Cube4:
             '2B':{4: 50, 5: 54, 6: 58, 7: 62, 50: 91, 54: 90, 58: 89, 62: 88, 88: 17, 89: 21, 90: 25, 91: 29, 17: 7, 21: 6, 25: 5, 29: 4} | {a: a for a in range(32, 48)},
             '2F':{8: 30, 9: 26, 10: 22, 11: 18, 18: 84, 22: 85, 26: 86, 30: 87, 84: 61, 85: 57, 86: 53, 87: 49, 49: 8, 53: 9, 57: 10, 61: 11} | {a: a for a in range(32, 48)}
         }
-        for m in self.moves:
+        for m in cls.moves:
             if len(m) == 2:
-                assert m in self.sticker_replacement
+                assert m in cls.sticker_replacement
             else:
                 if m[-1] == "'":
-                    self.sticker_replacement[m] = {
-                        v: k for k, v in self.sticker_replacement[m[:2]].items()
+                    cls.sticker_replacement[m] = {
+                        v: k for k, v in cls.sticker_replacement[m[:2]].items()
                     }
                 elif m[-1] == "2":
-                    self.sticker_replacement[m] = {
-                        k: self.sticker_replacement[m[:2]][v]
-                        for k, v in self.sticker_replacement[m[:2]].items()
+                    cls.sticker_replacement[m] = {
+                        k: cls.sticker_replacement[m[:2]][v]
+                        for k, v in cls.sticker_replacement[m[:2]].items()
                     }
                 else:
                     raise
 
-            self.sticker_target[m] = list(self.sticker_replacement[m].keys())
-            self.sticker_source[m] = list(self.sticker_replacement[m].values())
+            cls.sticker_target[m] = list(cls.sticker_replacement[m].keys())
+            cls.sticker_source[m] = list(cls.sticker_replacement[m].values())
 
-            for i, idx in enumerate(self.sticker_target[m]):
-                assert self.sticker_replacement[m][idx] == self.sticker_source[m][i]
+            for i, idx in enumerate(cls.sticker_target[m]):
+                assert cls.sticker_replacement[m][idx] == cls.sticker_source[m][i]
 
         # For index slicing
-        self.sticker_target_ix = np.array([np.array(self.sticker_target[m]) for m in self.moves])
-        self.sticker_source_ix = np.array([np.array(self.sticker_source[m]) for m in self.moves])
+        cls.sticker_target_ix = np.array([np.array(cls.sticker_target[m]) for m in cls.moves])
+        cls.sticker_source_ix = np.array([np.array(cls.sticker_source[m]) for m in cls.moves])
+
+        # Full sticker permutations: `state[move_perms[ix]]` is the state after move `ix`
+        cls.move_perms = np.tile(np.arange(len(cls.goal)), (len(cls.moves), 1))
+        np.put_along_axis(cls.move_perms, cls.sticker_target_ix, cls.sticker_source_ix, axis=1)
+
+
+class BatchCube4:
+    """
+    Independent random walks on the 4x4 cube, advanced together on an (N, 96) array of states.
+
+    Each walk follows the distribution of `Cube4.scrambler`: moves are drawn uniformly among those allowed after the
+    last one (`moves_ix_available_after`), except for a third consecutive repeat of the same move. Instead of
+    rejection sampling one walk at a time, every walk draws an index into a precomputed table of its allowed moves.
+    """
+    def __init__(self, num_walks, seed=None):
+        self.env = Cube4()
+        self.num_walks = num_walks
+        self.rng = np.random.default_rng(seed)
+
+        # allowed[m, r]: the moves that may follow move m (the extra last row, m = -1, allows any first move),
+        # without m itself if r = 1 (after a repeat); padded with -1 beyond their count num_allowed[m, r]
+        num_moves = len(self.env.moves)
+        self.allowed = np.full((num_moves + 1, 2, num_moves), -1)
+        self.num_allowed = np.zeros((num_moves + 1, 2), dtype=np.int64)
+        for m in range(-1, num_moves):
+            available_moves = sorted(self.env.moves_ix_available_after[m]) if m >= 0 else self.env.moves_ix
+            for repeat, moves in enumerate([available_moves, [v for v in available_moves if v != m]]):
+                self.allowed[m, repeat, :len(moves)] = moves
+                self.num_allowed[m, repeat] = len(moves)
+        self.reset()
+
+    def reset(self, states=None, train=False):
+        """
+        Resets every walk to the solved state, or to the given (N, 96) array of states.
+        If train mode is on, walks start from random reduced 3x3 states instead (see `Cube4.sample_reduced_states`).
+        """
+        if states is None:
+            states = self.env.sample_reduced_states(self.num_walks, self.rng) if train else np.tile(self.env.goal, (self.num_walks, 1))
+        self.states = np.array(states, dtype=self.env.DTYPE)
+        self.last_moves = np.full(self.num_walks, -1)
+        self.prev_moves = np.full(self.num_walks, -1)
+
+    def step(self):
+        """Advances every walk by one random move, returning the moves."""
+        repeat = ((self.prev_moves == self.last_moves) & (self.last_moves >= 0)).astype(np.int64) # Three subsequent moves that could be one
+        choice = (self.rng.random(self.num_walks) * self.num_allowed[self.last_moves, repeat]).astype(np.int64)
+        moves = self.allowed[self.last_moves, repeat, choice] # uniform among the allowed moves
+
+        # walks turned by the same move share a column permutation, cheaper than a gather of (N, 96) indices
+        states = np.empty_like(self.states)
+        for m in np.unique(moves):
+            rows = np.flatnonzero(moves == m)
+            states[rows] = self.states[rows][:, self.env.move_perms[m]]
+        self.states = states
+        self.prev_moves, self.last_moves = self.last_moves, moves
+        return moves
+
+    def generate(self, scramble_length, states=None, train=False):
+        """
+        Scrambles every walk for `scramble_length` moves, from the states of `reset(states, train)`.
+        Returns the (N, scramble_length, 96) states after each move and the (N, scramble_length) moves applied to reach them,
+        which are the inputs and labels of `Model` once reshaped to (-1, 96) and (-1,).
+        """
+        self.reset(states, train)
+        X = np.empty((self.num_walks, scramble_length, self.states.shape[1]), dtype=self.env.DTYPE)
+        y = np.empty((self.num_walks, scramble_length), dtype=np.int64)
+        for i in range(scramble_length):
+            y[:, i] = self.step()
+            X[:, i] = self.states
+        return X, y
 
 
 class Cube3:
@@ -487,11 +758,26 @@ class Cube3:
     A class for 3x3x3 Rubik's Cube
     """
     def __init__(self):
-        self.DTYPE = np.int64
-
-        # Define initial and goal state
+        # Move tables are built once per process and shared (read-only) by every instance
+        if "sticker_target_ix" not in Cube3.__dict__:
+            Cube3.__build_tables()
+        # Define initial state
         self.reset()
-        self.goal = np.arange(0, 9 * 6, dtype=self.DTYPE) // 9
+
+    def __setstate__(self, state):
+        # Unpickling skips `__init__`, so a fresh (e.g. spawned) process must build the tables here
+        if "sticker_target_ix" not in Cube3.__dict__:
+            Cube3.__build_tables()
+        self.__dict__.update(state)
+
+    @classmethod
+    def __build_tables(cls):
+        """Defines the moves and their lookup tables as class attributes."""
+        cls.DTYPE = np.uint8 # colors 0..5; compact states are cheaper to copy, gather and hash
+
+        # Define goal state
+        cls.goal = np.arange(0, 9 * 6, dtype=cls.DTYPE) // 9
+        cls.goal.flags.writeable = False
 
         # Define moves
         ## faces and turns
@@ -499,11 +785,11 @@ class Cube3:
         ## [90 degrees clockwise, 90 degrees counter-clockwise]
         degrees = ["", "'"]
         degrees_inference = degrees[::-1]
-        self.moves = [f"{f}{n}" for f in faces for n in degrees]
-        self.moves_inference = [f"{f}{n}" for f in faces for n in degrees_inference]
+        cls.moves = [f"{f}{n}" for f in faces for n in degrees]
+        cls.moves_inference = [f"{f}{n}" for f in faces for n in degrees_inference]
 
         # Opposite faces
-        self.pairing = {
+        cls.pairing = {
             "R": "L",
             "L": "R",
             "F": "B",
@@ -511,20 +797,23 @@ class Cube3:
             "U": "D",
             "D": "U",
         }
+        # Notation tokens: a face, with an optional counter-clockwise or half-turn
+        cls.token_pattern = re.compile(r"[UDLRBF]['2]?")
+
         # Prohibit obviously redundant moves.
-        self.moves_available_after = {
-            m: [v for v in self.moves if v[0] != m[0]] + [m] 
-            for m in self.moves
+        cls.moves_available_after = {
+            m: [v for v in cls.moves if v[0] != m[0]] + [m] 
+            for m in cls.moves
         } # self-cancelling moves on the same face
 
         # [OPTIMIZATION] slicing by move string (e.g., R', U, F) => indices (e.g., 2, 6, 1)
-        self.moves_ix = [self.moves.index(m) for m in self.moves]
-        self.moves_ix_available_after = {
-            self.moves.index(m): [self.moves.index(m) for m in available_moves]
-            for m, available_moves in self.moves_available_after.items()
+        cls.moves_ix = [cls.moves.index(m) for m in cls.moves]
+        cls.moves_ix_available_after = {
+            cls.moves.index(m): [cls.moves.index(m) for m in available_moves]
+            for m, available_moves in cls.moves_available_after.items()
         }
-        self.moves_ix_inference = [self.moves.index(m) for m in self.moves_inference]
-        self.pairing_ix = {
+        cls.moves_ix_inference = [cls.moves.index(m) for m in cls.moves_inference]
+        cls.pairing_ix = {
             0: 1,
             1: 0,
             2: 3,
@@ -534,7 +823,11 @@ class Cube3:
         } # Points to the opposite face index
 
         # Vectorize the sticker group replacement operations
-        self.__vectorize_moves()
+        cls.__vectorize_moves()
+        cls.sticker_target_ix.flags.writeable = False
+        cls.sticker_source_ix.flags.writeable = False
+        cls.move_perms.flags.writeable = False
+        cls.token_perms = {}
 
     def reset(self):
         """Resets the cube state to the solved state."""
@@ -544,6 +837,10 @@ class Cube3:
         """Checks if the cube is in the solved state."""
         return np.all(self.state == self.goal)
 
+    def batch_is_solved(self, states):
+        """Batch version of `is_solved`, taking an (N, 54) array of states."""
+        return np.all(states == self.goal, axis=1)
+
     def finger(self, move):
         """Applies a single move on the cube state using move string."""
         self.state[self.sticker_target[move]] = self.state[self.sticker_source[move]]
@@ -553,15 +850,40 @@ class Cube3:
         self.state[self.sticker_target_ix[ix]] = self.state[self.sticker_source_ix[ix]]
 
     def apply_scramble(self, scramble):
-        """Applies a sequence of moves (scramble) to the cube state."""
+        """Applies a sequence of moves (scramble) to the cube state, with a single gather (see `compile_scramble`)."""
+        self.state[:] = self.state[self.compile_scramble(scramble)]
+
+    def batch_apply_scramble(self, states, scramble):
+        """Applies the same scramble to every row of an (N, 54) array of states, returning the new states."""
+        return states[:, self.compile_scramble(scramble)]
+
+    def scrambled_states(self, scrambles):
+        """Returns the (N, 54) array of states reached by applying each of the given scrambles to the solved cube."""
+        return self.goal[np.array([self.compile_scramble(scramble) for scramble in scrambles]).reshape(-1, 9 * 6)]
+
+    @classmethod
+    def parse_token(cls, token):
+        """Validates a notation token against `token_pattern`, raising a `ValueError` otherwise, and returns it."""
+        if not isinstance(token, str) or not cls.token_pattern.fullmatch(token):
+            raise ValueError(f"Invalid move `{token}`")
+        return token
+
+    @classmethod
+    def compile_scramble(cls, scramble):
+        """Compiles a sequence of moves (e.g. R U2 F') into a single sticker permutation `perm`, such that `state[perm]` is the state after the sequence."""
         if isinstance(scramble, str):
             scramble = scramble.split()
+        perm = np.arange(9 * 6)
         for m in scramble:
-            if m[-1]=='2':
-                for _ in range(2):
-                    self.finger(m[0])
-            else:
-                    self.finger(m)
+            if m not in cls.token_perms:
+                cls.parse_token(m)
+                if m[-1] == '2':
+                    quarter_turn = cls.move_perms[cls.moves.index(m[0])]
+                    cls.token_perms[m] = quarter_turn[quarter_turn]
+                else:
+                    cls.token_perms[m] = cls.move_perms[cls.moves.index(m)]
+            perm = perm[cls.token_perms[m]]
+        return perm
 
     def scrambler(self, scramble_length):
         """
@@ -610,10 +932,11 @@ class Cube3:
                 yield self.state, move
 
 
-    def __vectorize_moves(self):
+    @classmethod
+    def __vectorize_moves(cls):
         """
         Vectorizes the sticker group replacement operations for faster computation.
-        This method defines ```self.sticker_target``` and ```self.sticker_source``` to manage sticker colors (target is replaced by source).
+        This method defines ```cls.sticker_target``` and ```cls.sticker_source``` to manage sticker colors (target is replaced by source).
         They define indices of target and source stickers so that the moves can be vectorized.
 
         Colors:
@@ -646,9 +969,9 @@ class Cube3:
                         10   13 16
                         [9]  12 15
         """
-        self.sticker_target, self.sticker_source = dict(), dict()
+        cls.sticker_target, cls.sticker_source = dict(), dict()
 
-        self.sticker_replacement = {
+        cls.sticker_replacement = {
             # Sticker A is replaced by another sticker at index B -> A:B
             'U':{0: 6, 1: 3, 2: 0, 3: 7, 5: 1, 6: 8, 7: 5, 8: 2, 20: 47, 23: 50, 26: 53, 29: 38, 32: 41, 35: 44, 38: 20, 41: 23, 44: 26, 47: 29, 50: 32, 53: 35},
             'D':{9: 15, 10: 12, 11: 9, 12: 16, 14: 10, 15: 17, 16: 14, 17: 11, 18: 36, 21: 39, 24: 42, 27: 45, 30: 48, 33: 51, 36: 27, 39: 30, 42: 33, 45: 18, 48: 21, 51: 24},
@@ -657,31 +980,35 @@ class Cube3:
             'B':{2: 35, 5: 34, 8: 33, 9: 20, 12: 19, 15: 18, 18: 2, 19: 5, 20: 8, 33: 9, 34: 12, 35: 15, 36: 42, 37: 39, 38: 36, 39: 43, 41: 37, 42: 44, 43: 41, 44: 38},
             'F':{0: 24, 3: 25, 6: 26, 11: 27, 14: 28, 17: 29, 24: 17, 25: 14, 26: 11, 27: 6, 28: 3, 29: 0, 45: 51, 46: 48, 47: 45, 48: 52, 50: 46, 51: 53, 52: 50, 53: 47}
         }
-        for m in self.moves:
+        for m in cls.moves:
             if len(m) == 1:
-                assert m in self.sticker_replacement
+                assert m in cls.sticker_replacement
             else:
                 if "'" in m:
-                    self.sticker_replacement[m] = {
-                        v: k for k, v in self.sticker_replacement[m[0]].items()
+                    cls.sticker_replacement[m] = {
+                        v: k for k, v in cls.sticker_replacement[m[0]].items()
                     }
                 elif "2" in m:
-                    self.sticker_replacement[m] = {
-                        k: self.sticker_replacement[m[0]][v]
-                        for k, v in self.sticker_replacement[m[0]].items()
+                    cls.sticker_replacement[m] = {
+                        k: cls.sticker_replacement[m[0]][v]
+                        for k, v in cls.sticker_replacement[m[0]].items()
                     }
                 else:
                     raise
 
-            self.sticker_target[m] = list(self.sticker_replacement[m].keys())
-            self.sticker_source[m] = list(self.sticker_replacement[m].values())
+            cls.sticker_target[m] = list(cls.sticker_replacement[m].keys())
+            cls.sticker_source[m] = list(cls.sticker_replacement[m].values())
 
-            for i, idx in enumerate(self.sticker_target[m]):
-                assert self.sticker_replacement[m][idx] == self.sticker_source[m][i]
+            for i, idx in enumerate(cls.sticker_target[m]):
+                assert cls.sticker_replacement[m][idx] == cls.sticker_source[m][i]
 
         # For index slicing
-        self.sticker_target_ix = np.array([np.array(self.sticker_target[m]) for m in self.moves])
-        self.sticker_source_ix = np.array([np.array(self.sticker_source[m]) for m in self.moves])
+        cls.sticker_target_ix = np.array([np.array(cls.sticker_target[m]) for m in cls.moves])
+        cls.sticker_source_ix = np.array([np.array(cls.sticker_source[m]) for m in cls.moves])
+
+        # Full sticker permutations: `state[move_perms[ix]]` is the state after move `ix`
+        cls.move_perms = np.tile(np.arange(len(cls.goal)), (len(cls.moves), 1))
+        np.put_along_axis(cls.move_perms, cls.sticker_target_ix, cls.sticker_source_ix, axis=1)
 
 
 def load_environment(name: str, verbose=False):
@@ -54,8 +54,8 @@ class Model(nn.Module):
         self.output = nn.Linear(1000, output_dim)
 
     def forward(self, inputs):
-        # int indices => float one-hot vectors
-        x = nn.functional.one_hot(inputs, num_classes=6).to(torch.float)
+        # int indices (of any integer dtype, e.g. uint8) => float one-hot vectors
+        x = (inputs.unsqueeze(-1) == torch.arange(6, dtype=inputs.dtype, device=inputs.device)).to(torch.float)
         x = x.reshape(-1, self.input_dim)
         x = self.embedding(x)
         for layer in self.layers:
@@ -63,6 +63,101 @@ class Model(nn.Module):
         logits = self.output(x)
         return logits
 
+class FoldedResidualBlock(nn.Module):
+    """
+    Inference-only `ResidualBlock`, with the BatchNorm of its first layer folded into its second linear layer,
+    and that of its second layer applied as a fixed affine transform before the skip-connection.
+    """
+    def __init__(self, fc1, fc2, scale, shift):
+        super(FoldedResidualBlock, self).__init__()
+        self.fc1, self.fc2 = fc1, fc2
+        self.register_buffer("scale", scale)
+        self.register_buffer("shift", shift)
+
+    def forward(self, inputs):
+        x = nn.functional.relu(self.fc1(inputs))
+        x = nn.functional.relu(self.fc2(x))
+        return torch.addcmul(inputs + self.shift, x, self.scale)
+
+class InferenceModel(nn.Module):
+    """
+    Inference-only equivalent of a trained `Model` (or a TorchScript export of it), in evaluation mode.
+
+    Every BatchNorm is reduced to the fixed affine transform it applies in evaluation mode, and folded into
+    the next linear layer wherever no skip-connection reads its output.
+    Measured on CPU, this is no faster than the original model (nor was a gather of embedding rows in place of
+    the one-hot matrix multiply, which was slower above a few rows), so `EfficientCube` does not use it by default.
+    """
+    def __init__(self, model):
+        super(InferenceModel, self).__init__()
+        params = {k: v.detach().float() for k, v in model.state_dict().items()}
+        eps = getattr(model.embedding.bn, "eps", 1e-5)
+
+        def bn_affine(prefix):
+            scale = params[f"{prefix}.weight"] / torch.sqrt(params[f"{prefix}.running_var"] + eps)
+            return scale, params[f"{prefix}.bias"] - params[f"{prefix}.running_mean"] * scale
+
+        def linear(prefix, scale=None, shift=None):
+            # `scale` and `shift` fold the affine transform of a preceding BatchNorm into the layer
+            weight, bias = params[f"{prefix}.weight"], params[f"{prefix}.bias"]
+            if scale is not None:
+                weight, bias = weight * scale, bias + weight @ shift
+            fc = nn.Linear(weight.shape[1], weight.shape[0])
+            fc.weight.data.copy_(weight)
+            fc.bias.data.copy_(bias)
+            return fc
+
+        # one-hot vectors => first linear layer
+        self.embedding = linear("embedding.fc")
+        self.input_dim = self.embedding.in_features
+
+        # first hidden layer, followed by residual blocks
+        self.fc = linear("layers.0.fc", *bn_affine("embedding.bn"))
+        scale, shift = bn_affine("layers.0.bn")
+        self.register_buffer("scale", scale)
+        self.register_buffer("shift", shift)
+        num_blocks = len({k.split(".")[1] for k in params if k.startswith("layers.")}) - 1
+        self.layers = nn.ModuleList([
+            FoldedResidualBlock(
+                linear(f"layers.{i}.layers.0.fc"),
+                linear(f"layers.{i}.layers.1.fc", *bn_affine(f"layers.{i}.layers.0.bn")),
+                *bn_affine(f"layers.{i}.layers.1.bn"),
+            )
+            for i in range(1, num_blocks + 1)
+        ])
+        self.output = linear("output")
+        self.eval()
+
+    def forward(self, inputs):
+        x = (inputs.unsqueeze(-1) == torch.arange(6, dtype=inputs.dtype, device=inputs.device)).to(torch.float)
+        x = x.reshape(-1, self.input_dim)
+        x = nn.functional.relu(self.embedding(x))
+        x = nn.functional.relu(self.fc(x))
+        x = torch.addcmul(self.shift, x, self.scale)
+        for layer in self.layers:
+            x = layer(x)
+        logits = self.output(x)
+        return logits
+
+class LongInputs(nn.Module):
+    """
+    Adapter for exported models (e.g. TorchScript) whose `forward` only accepts int64 indices,
+    so that they can be fed compact uint8 states like `Model` and `InferenceModel`.
+    """
+    def __init__(self, model):
+        super(LongInputs, self).__init__()
+        self.model = model
+
+    def forward(self, inputs):
+        return self.model(inputs.long())
+
+def quantize_model(model):
+    """
+    Returns a copy of `model` whose `nn.Linear` layers are dynamically quantized to int8 (weights stored in int8,
+    activations quantized on the fly). Quantized layers only run on CPU.
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
 if __name__=="__main__":
     # Define `model` and load it on device
     device = torch.device('cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu')
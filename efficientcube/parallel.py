@@ -0,0 +1,69 @@
+"""
+Process-pool parallel solving on CPU.
+
+The beam search of a single solve runs on one Python thread, so many-core machines are only used by the model's
+intra-op threads. `ParallelSolver` instead fans scrambles out to worker processes. The weights of the models are moved
+to shared memory once, in the parent, and every worker maps the same buffers rather than holding a private copy
+(a memory-mapped endgame table is likewise reopened by path). Torch threads are split evenly across the workers.
+"""
+
+import os
+import torch
+import torch.multiprocessing as mp
+
+_solver = None # the solver of a worker process
+
+
+class ParallelSolver:
+    """
+    Solves scrambles in parallel with copies of `solver` sharing its model weights.
+
+    Args:
+        solver (EfficientCube): A CPU solver, whose models are moved to shared memory.
+        num_workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        threads_per_worker (int, optional): Torch intra-op threads of each worker. Defaults to an even split of the CPUs.
+        start_method (str, optional): "spawn", "forkserver", or "fork". Defaults to "spawn", except for int8 models,
+            whose packed weights cannot be sent to other processes: they are left to forked workers, copy-on-write.
+    """
+    def __init__(self, solver, num_workers=None, threads_per_worker=None, start_method=None):
+        assert solver.device.type == "cpu", "Parallel solving is only supported on CPU"
+        num_cpus = os.cpu_count() or 1
+        self.num_workers = num_workers or num_cpus
+        self.threads_per_worker = threads_per_worker or max(1, num_cpus // self.num_workers)
+
+        solver.model.share_memory()
+        if solver.env_name == '4x4':
+            solver.cube3_solver.model.share_memory()
+        start_method = start_method or ("fork" if solver.precision == "int8" else "spawn")
+        self.pool = mp.get_context(start_method).Pool(
+            self.num_workers, initializer=_init_worker, initargs=(solver, self.threads_per_worker),
+        )
+
+    def solve_many(self, scrambles, beam_width):
+        """Same as `EfficientCube.solve_many`, with each scramble solved by the next free worker. Results keep the input order."""
+        return list(self.imap(scrambles, beam_width))
+
+    def imap(self, scrambles, beam_width):
+        """Lazily yields the results of `solve_many` in order, as they are ready."""
+        return self.pool.imap(_solve, ((scramble, beam_width) for scramble in scrambles))
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _init_worker(solver, num_threads):
+    global _solver
+    torch.set_num_threads(num_threads)
+    _solver = solver
+
+
+def _solve(args):
+    scramble, beam_width = args
+    return _solver.solve_many([scramble], beam_width)[0]
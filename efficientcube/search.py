@@ -5,10 +5,13 @@ The `beam_search` function in this file is designed for readability and reproduc
 
 import time
 import numpy as np
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from contextlib import nullcontext
 import torch
 from tqdm import tqdm
+from .utils import state_hashes
 
 @torch.no_grad()
 def beam_search(
@@ -21,7 +24,8 @@ def beam_search(
         enable_fp16=False
     ):
     """
-    Beam search algorithm to find a solution path based on a cumulative product of estimated probabilities.
+    Beam search algorithm to find a solution path based on a cumulative sum of estimated log-probabilities
+    (equivalent in ranking to their product, but free of float underflow at depth).
 
     Args:
         env (object): A scrambled instance of the given environment.
@@ -51,20 +55,23 @@ def beam_search(
         # metrics
         num_nodes, time_0 = 0, time.time()
         candidates = [
-            {"state":deepcopy(env.state), "path":[], "value":1.}
+            {"state":deepcopy(env.state), "parent":None, "move":None, "prev_move":None, "value":0.}
         ] # list of dictionaries
+        # Paths are stored as per-depth arrays of parent indices and move indices,
+        # and the solution path is only rebuilt (backtracked) once the goal is found.
+        parents, moves = [], []
 
         for depth in tqdm(range(max_depth+1)):
             # TWO things at a time for every candidate: 1. check if solved & 2. add to batch_x
-            batch_x = np.zeros((len(candidates), env.state.shape[-1]), dtype=np.int64)
+            batch_x = np.zeros((len(candidates), env.state.shape[-1]), dtype=env.DTYPE)
             for i,c in enumerate(candidates):
-                c_path, env.state = c["path"], c["state"]
-                if c_path:
-                    env.finger_ix(c_path[-1])
+                env.state = c["state"]
+                if depth:
+                    env.finger_ix(c["move"])
                     num_nodes += 1
                     if env.is_solved():
                         # Revert: array of indices => array of notations
-                        c_path = [str(env.moves[i]) for i in c_path]
+                        c_path = [str(env.moves[m]) for m in _backtrack(parents, moves, i)]
                         return {'solutions':c_path, "num_nodes":num_nodes, "times":time.time()-time_0}
                 batch_x[i, :] = env.state
 
@@ -77,33 +84,32 @@ def beam_search(
             if len(candidates) < 2**17:
                 batch_x = torch.from_numpy(batch_x).to(device)
                 batch_p = model(batch_x)
-                batch_p = torch.nn.functional.softmax(batch_p, dim=-1)
+                batch_p = torch.nn.functional.log_softmax(batch_p.float(), dim=-1)
                 batch_p = batch_p.detach().cpu().numpy()
             else:
                 # split the batch so as to avoid 'CUDA out of memory' error.
                 batch_p = [
-                    torch.nn.functional.softmax( model( torch.from_numpy(batch_x_mini).to(device) ) ).to('cpu').detach().numpy() 
+                    torch.nn.functional.log_softmax( model( torch.from_numpy(batch_x_mini).to(device) ).float(), dim=-1 ).to('cpu').detach().numpy() 
                     for batch_x_mini in np.split(batch_x, len(candidates)//(2**16))
                 ]
                 batch_p = np.concatenate(batch_p)
 
             # loop over candidates
-            candidates_next_depth = []  # storage for the depth-level candidates storing (path, value, index).
+            candidates_next_depth = []  # storage for the depth-level candidates storing (parent, moves, value).
             for i, c in enumerate(candidates):
-                c_path = c["path"]
                 value_distribution = batch_p[i, :] # output logits for the given state
-                value_distribution *= c["value"] # multiply the cumulative probability so far of the expanded path
+                value_distribution += c["value"] # add the cumulative log-probability so far of the expanded path
 
                 for m, value in zip(env.moves_ix_inference, value_distribution): # iterate over all possible moves.
                     # predicted value to expand the path with the given move.
 
-                    if c_path and skip_redundant_moves:
-                        if m not in env.moves_ix_available_after[c_path[-1]]:
+                    if depth and skip_redundant_moves:
+                        if m not in env.moves_ix_available_after[c["move"]]:
                             # Two mutually canceling moves
                             continue
-                        elif len(c_path) > 1:
+                        elif depth > 1:
                             # if c_path[-2] == c_path[-1] == m:
-                            if c_path[-2] == c_path[-1] == m:
+                            if c["prev_move"] == c["move"] == m:
                                 # Three subsequent moves that could be one
                                 continue
                             # elif (
@@ -120,7 +126,9 @@ def beam_search(
                     # add to the next-depth candidates unless 'continue'd.
                     candidates_next_depth.append({
                         'state':deepcopy(c['state']),
-                        "path": c_path+[m],
+                        "parent": i,
+                        "move": m,
+                        "prev_move": c["move"],
                         "value":value,
                     })
 
@@ -128,3 +136,460 @@ def beam_search(
             candidates = sorted(candidates_next_depth, key=lambda item: -item['value'])
             # if the number of candidates exceed that of beam width 'beam_width'
             candidates = candidates[:beam_width]
+            parents.append(np.array([c["parent"] for c in candidates]))
+            moves.append(np.array([c["move"] for c in candidates]))
+
+
+def beam_search_vectorized(
+        env,
+        model,
+        beam_width=1024,
+        max_depth=64, # Any arbitrary number above God's number will do
+        skip_redundant_moves=True,
+        device = torch.device('cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu'),
+        enable_fp16=False,
+        precision="fp32",
+        deduplicate=True,
+        max_visited=0,
+        cache=None,
+        endgame=None,
+        pipeline_chunks=1,
+        num_candidates=1,
+        depth_slack=0,
+        deadline=None,
+    ):
+    """
+    Array-backed counterpart of `beam_search`, with the same arguments and return value, plus the options of
+    `beam_search_many`: a `precision` mode, the pruning of transpositions (`deduplicate`, `max_visited`),
+    a `PolicyCache` of model outputs (`cache`), an `EndgameTable` to finish early (`endgame`), the overlap of
+    inference with scoring (`pipeline_chunks`), the collection of several solutions (`num_candidates`, `depth_slack`),
+    and a wall-clock `deadline`.
+
+    `beam_width` may also be a schedule of increasing widths (e.g. `[2**10, 2**11, ..., 2**15]`), which are tried in turn
+    until a search succeeds or the deadline passes, so that easy scrambles only pay for a narrow beam. The result then
+    tells the `beam_width` that found it.
+
+    Instead of a list of dictionaries each holding its own copy of the state, the beam is kept as contiguous arrays:
+    an (N, num_stickers) state matrix, a cumulative-score vector, and per-depth parent/move index arrays from which the
+    solution path is rebuilt once the goal is found. At each depth, the children of every candidate are scored at once,
+    the top `beam_width` are picked with a partial selection, and only the selected children are materialized with
+    a single gather through the full sticker permutations of the moves.
+
+    Scores are accumulated log-probabilities kept on the model's device, where redundant moves are masked with a
+    precomputed (num_moves, num_moves) tensor and the top-k is taken; only the selected indices and scores are copied
+    back to the host.
+    """
+    for width in ([beam_width] if np.ndim(beam_width) == 0 else beam_width):
+        result = beam_search_many(
+            env, model, env.state[None, :], width, max_depth, skip_redundant_moves, device, enable_fp16, precision,
+            deduplicate=deduplicate, max_visited=max_visited, cache=cache, endgame=endgame, pipeline_chunks=pipeline_chunks,
+            num_candidates=num_candidates, depth_slack=depth_slack, deadline=deadline,
+        )[0]
+        if result is not None:
+            if np.ndim(beam_width) != 0:
+                result['beam_width'] = width
+            return result
+        if deadline is not None and time.time() >= deadline:
+            break
+    return None
+
+
+@torch.no_grad()
+def beam_search_many(
+        env,
+        model,
+        states,
+        beam_width=1024,
+        max_depth=64, # Any arbitrary number above God's number will do
+        skip_redundant_moves=True,
+        device = torch.device('cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu'),
+        enable_fp16=False,
+        precision="fp32",
+        deduplicate=True,
+        max_visited=0,
+        cache=None,
+        endgame=None,
+        pipeline_chunks=1,
+        search_groups=None,
+        num_candidates=1,
+        depth_slack=0,
+        deadline=None,
+        report_failures=False,
+        verbose=True,
+    ):
+    """
+    Runs the beam searches of many scrambled states together (see `beam_search_vectorized`).
+
+    The candidates of all the searches live in the same arrays, grouped by the index of their scrambled state,
+    so that they share every model batch; each search keeps its own top `beam_width` candidates per depth,
+    and retires from the batch as soon as it is solved.
+
+    Args:
+        env (object): An instance of the given environment, used for its moves and goal test.
+        states (np.ndarray): Scrambled states, of shape (num_states, num_stickers).
+        precision (str, optional): "fp32", "fp16" (same as `enable_fp16`), "bf16" (autocast on any device, including CPU),
+            or "int8" for a model quantized with `model.quantize_model`. Defaults to "fp32".
+        deduplicate (bool, optional): If True, paths reaching the same state at the same depth (e.g. `1U 1D` and `1D 1U`)
+            are merged into the best-scoring one, so that they do not waste beam slots. Defaults to True.
+        max_visited (int, optional): If positive, the number of most recently expanded states (across depths) that
+            are remembered so as not to be expanded again. Defaults to 0 (disabled).
+        cache (PolicyCache, optional): Cache of the model outputs, looked up before every model call so that only the
+            states missing from it are evaluated. It may be shared across searches with the same model. Defaults to None.
+        endgame (EndgameTable, optional): Table of the states near the goal (3x3 only), against which every depth (including
+            the scrambled states) is checked instead of the goal test; a search finishes as soon as one of its candidates
+            is found, with the table's optimal suffix appended to its path. Defaults to None.
+        pipeline_chunks (int, optional): If above 1, the beam of each depth is split into as many chunks, and the model
+            is evaluated on the next chunk in a worker thread while the children of the current one are scored and
+            merged into a running top-k. The search is the same as with a single chunk. Defaults to 1.
+        search_groups (np.ndarray, optional): Sorted index of the search each state belongs to, for searches starting
+            from several roots at once (the first root to reach the goal wins). Each root keeps its own `beam_width`
+            candidates per depth, while all of them share the model batches. Defaults to one search per state.
+        num_candidates (int, optional): If above 1, each search goes on after reaching the goal, and collects up to
+            `num_candidates` solutions ending in states that are distinct (up to rotation on the 4x4), found within
+            `depth_slack` moves of the first one. They are listed, shortest and best-scoring first, as the `candidates`
+            of the result: dictionaries with the `solutions` and the goal `state` they end in. Not supported with an
+            `endgame` table. Defaults to 1.
+        depth_slack (int, optional): See `num_candidates`. Defaults to 0.
+        deadline (float, optional): A `time.time()` value after which the searches stop expanding, returning the
+            solutions found so far. Defaults to None.
+        report_failures (bool, optional): If True, a search that fails still gets a result, whose `solutions` are None,
+            with the nodes and time it spent (e.g. to benchmark throughput over every search). Defaults to False.
+        verbose (bool, optional): If False, the searches that fail are not reported on stdout. Defaults to True.
+        Other arguments are the same as in `beam_search`.
+
+    Returns:
+        list: One result per search, each of which is the dictionary `beam_search` would return, or None (see `report_failures`).
+        `times` is measured from the start of the batch, `depth_times` lists the time spent on each depth,
+        `num_duplicates` counts the pruned transpositions, and `root` is the index of the state the solution starts from.
+    """
+
+    env_class_name = env.__class__.__name__
+    assert env_class_name in ['Cube3','Cube4']
+    collect = num_candidates > 1
+    assert not (collect and endgame is not None), "Candidates cannot be collected with an endgame table"
+
+    num_moves = len(env.moves)
+    move_perms = env.move_perms
+    inference_order = torch.from_numpy(np.argsort(env.moves_ix_inference)).to(device) # model output columns => move indices
+    allowed_after = torch.from_numpy(_allowed_after(env)).to(device)
+
+    precision = "fp16" if enable_fp16 else precision
+
+    def predict(start, stop):
+        """Log-policy, in move order, of the states [start, stop) of the beam."""
+        if cache is None:
+            return _log_policy(model, states[start:stop], device)[:, inference_order]
+        return _cached_log_policy(model, states[start:stop], device, cache, inference_order)
+
+    @torch.no_grad()
+    def predict_in_worker(start, stop):
+        with _precision_context(device, precision): # autocast is thread-local
+            return predict(start, stop)
+
+    def score(log_policy, start, stop, depth):
+        """Flattened cumulative log-probabilities of the children of the states [start, stop) of the beam."""
+        child_scores = log_policy + scores_device[start:stop, None]
+        if depth and skip_redundant_moves:
+            last = torch.from_numpy(last_moves[start:stop]).to(device)
+            mask = allowed_after[last] # Two mutually canceling moves
+            triple = torch.from_numpy(np.flatnonzero(prev_moves[start:stop] == last_moves[start:stop])).to(device)
+            mask[triple, last[triple]] = False # Three subsequent moves that could be one
+            child_scores.masked_fill_(~mask, -torch.inf)
+        return child_scores.ravel()
+
+    model.eval()
+    with _precision_context(device, precision), (ThreadPoolExecutor(1) if pipeline_chunks > 1 else nullcontext()) as executor:
+        # metrics
+        time_0 = time.time()
+        states = np.array(states, dtype=env.DTYPE).reshape(len(states), -1)
+        groups = np.arange(len(states)) if search_groups is None else np.asarray(search_groups)
+        num_roots = int(groups.max()) + 1 if len(groups) else 0 # number of searches
+        num_nodes = np.zeros(num_roots, dtype=np.int64)
+        num_duplicates = np.zeros(num_roots, dtype=np.int64)
+        results = [None] * num_roots
+        done = np.zeros(num_roots, dtype=bool) # searches retired from the beam
+        found_depths = np.full(num_roots, -1) # depth of the first solution of each search
+        candidate_keys = [set() for _ in range(num_roots)] if collect else None
+
+        # the beam, sorted by the index of the search (`groups`), with the index of the state each path starts from (`roots`)
+        roots = np.arange(len(states))
+        scores = np.zeros(len(states)) # cumulative log-probabilities, also kept on device as `scores_device`
+        scores_device = torch.zeros(len(states), device=device)
+        last_moves = np.full(len(states), -1)
+        prev_moves = np.full(len(states), -1)
+        parents, moves = [], [] # per-depth index arrays to backtrack the solution paths
+
+        # transposition table: keys of recently expanded states, per depth
+        prune = deduplicate or max_visited > 0
+        visited = deque([_transposition_keys(env, states, groups)]) if max_visited > 0 else None
+
+        depth_starts = []
+        for depth in tqdm(range(max_depth+1)):
+            depth_starts.append(time.time())
+            if depth or endgame is not None:
+                num_nodes += np.bincount(groups, minlength=num_roots) if depth else 0
+                if endgame is None:
+                    solved, suffix_lengths = env.batch_is_solved(states), np.zeros(len(states), dtype=np.int64)
+                else:
+                    solved, suffix_lengths = endgame.lookup(states)
+                for g in np.unique(groups[solved]):
+                    # The shortest, then best-scoring solution, as the sequential goal test of `beam_search` would return
+                    start, stop = np.searchsorted(groups, [g, g+1])
+                    found = start + np.flatnonzero(solved[start:stop])
+                    found = found[np.lexsort((-scores[found], suffix_lengths[found]))]
+                    if results[g] is None:
+                        i = found[0]
+                        num_nodes[g] -= np.count_nonzero(scores[start:stop] < scores[i])
+                        path = _backtrack(parents, moves, i)
+                        if endgame is not None:
+                            path += endgame.suffix(states[i])
+                        results[g] = {'solutions':[str(env.moves[m]) for m in path], "num_nodes":int(num_nodes[g]), "times":time.time()-time_0, "num_duplicates":int(num_duplicates[g]),
+                                      "depth_times":np.diff(depth_starts + [time.time()]).tolist(), "root":int(roots[i])}
+                        found_depths[g] = depth
+                    if collect:
+                        candidates = results[g].setdefault('candidates', [])
+                        for i, key in zip(found, _transposition_keys(env, states[found], groups[found])):
+                            if len(candidates) < num_candidates and key not in candidate_keys[g]:
+                                candidate_keys[g].add(key)
+                                candidates.append({'solutions':[str(env.moves[m]) for m in _backtrack(parents, moves, i)], 'state':states[i].copy()})
+
+                # retire the solved searches, once they have collected their candidates
+                solved_searches = found_depths >= 0
+                if collect:
+                    num_collected = np.array([len(result['candidates']) if result else 0 for result in results])
+                    solved_searches &= (num_collected >= num_candidates) | (depth >= found_depths + depth_slack)
+                done |= solved_searches
+                keep = ~done[groups]
+                if not keep.all():
+                    states, groups, roots, scores = states[keep], groups[keep], roots[keep], scores[keep]
+                    scores_device = scores_device[torch.from_numpy(keep).to(device)]
+                    last_moves, prev_moves = last_moves[keep], prev_moves[keep]
+                    if depth:
+                        parents[-1], moves[-1] = parents[-1][keep], moves[-1][keep]
+                    if not len(states):
+                        return results
+
+            # after checking the nodes expanded at the deepest, or at the deadline
+            if depth==max_depth or (deadline is not None and time.time() >= deadline):
+                num_unsolved = len(np.unique(groups[found_depths[groups] < 0]))
+                if num_unsolved and verbose:
+                    reason = " (deadline reached)" if depth < max_depth else ""
+                    print(f"Solution not found{reason}." if num_roots == 1 else f"Solution not found for {num_unsolved} of {num_roots} states{reason}.")
+                if report_failures:
+                    for g in np.unique(groups[found_depths[groups] < 0]):
+                        results[g] = {'solutions':None, "num_nodes":int(num_nodes[g]), "times":time.time()-time_0, "num_duplicates":int(num_duplicates[g]),
+                                      "depth_times":np.diff(depth_starts + [time.time()]).tolist()}
+                return results
+
+            # make predictions with the trained DNN, add the cumulative log-probability so far of each path,
+            # and select the top `beam_width` children of each root (twice as many when some may be pruned as transpositions),
+            # so that the roots of a search do not split its beam
+            num_selected = beam_width * 2 if prune else beam_width
+            if executor is None:
+                child_scores = score(predict(0, len(states)), 0, len(states), depth)
+                starts = np.flatnonzero(np.r_[True, roots[1:] != roots[:-1]])
+                stops = np.r_[starts[1:], len(roots)]
+                top_scores, top = [], []
+                for start, stop in zip(starts, stops):
+                    segment = child_scores[start*num_moves:stop*num_moves]
+                    segment_scores, segment_top = torch.topk(segment, min(num_selected, len(segment)), sorted=False)
+                    top_scores.append(segment_scores)
+                    top.append(segment_top + start*num_moves)
+                top_scores, top = torch.cat(top_scores), torch.cat(top)
+            else:
+                # pipelined: the model evaluates chunk k+1 while the children of chunk k are merged into the running top-k
+                bounds = np.unique(np.linspace(0, len(states), pipeline_chunks + 1).astype(int))
+                roots_device = torch.from_numpy(roots).to(device)
+                top_scores, top = torch.empty(0, device=device), torch.empty(0, dtype=torch.long, device=device)
+                future = executor.submit(predict_in_worker, bounds[0], bounds[1])
+                for k, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+                    log_policy = future.result()
+                    if k + 2 < len(bounds):
+                        future = executor.submit(predict_in_worker, stop, bounds[k+2])
+                    top_scores = torch.cat([top_scores, score(log_policy, start, stop, depth)])
+                    top = torch.cat([top, torch.arange(start*num_moves, stop*num_moves, device=device)])
+                    keep = _top_per_group_device(top_scores, roots_device[top // num_moves], num_selected)
+                    top_scores, top = top_scores[keep], top[keep]
+
+            # in the order of the beam, whichever way they were selected
+            top, order = torch.sort(top)
+            scores_device = top_scores[order]
+            scores, top = scores_device.cpu().numpy().astype(np.float64), top.cpu().numpy()
+
+            # drop masked children, selected only when fewer than `beam_width` were left
+            if not np.isfinite(scores).all():
+                finite = np.isfinite(scores)
+                scores, top = scores[finite], top[finite]
+                scores_device = scores_device[torch.from_numpy(finite).to(device)]
+            parent, move = np.divmod(top, num_moves)
+
+            # materialize the selected children only
+            states = states[parent[:, None], move_perms[move]]
+            groups, roots = groups[parent], roots[parent]
+
+            if prune:
+                keys = _transposition_keys(env, states, groups)
+                unique = _best_per_key(keys, scores) if deduplicate else np.arange(len(keys))
+                if visited:
+                    unique = unique[~np.isin(keys[unique], np.concatenate(visited))]
+                num_duplicates += np.bincount(groups, minlength=num_roots) - np.bincount(groups[unique], minlength=num_roots)
+                keep = _top_per_group(roots[unique], scores[unique], beam_width)
+                keep = unique[keep]
+                states, groups, roots, scores, parent, move = states[keep], groups[keep], roots[keep], scores[keep], parent[keep], move[keep]
+                scores_device = scores_device[torch.from_numpy(keep).to(device)]
+                if visited is not None:
+                    visited.append(keys[keep])
+                    while len(visited) > 1 and sum(map(len, visited)) > max_visited:
+                        visited.popleft()
+                    visited[0] = visited[0][:max_visited] # the depth just expanded may alone exceed the limit
+
+            prev_moves, last_moves = last_moves[parent], move
+            parents.append(parent)
+            moves.append(move)
+
+
+class PolicyCache:
+    """
+    Bounded cache of the model's log-policy (in move order) keyed on state hash, evicting the least recently used entries.
+
+    A beam keeps reaching the same near-goal states, and so do consecutive solves; with a cache passed to
+    `beam_search_many`, only the states it misses are batched to the model. A cache holds the outputs of a single model
+    (and precision), so each search stage needs its own.
+
+    Args:
+        max_entries (int, optional): Maximum number of cached states.
+        max_bytes (int, optional): Maximum size of the cached keys and values, in bytes (Python overhead not included).
+        At least one of the two limits must be given.
+    """
+    def __init__(self, max_entries=None, max_bytes=None):
+        assert max_entries or max_bytes, "Either `max_entries` or `max_bytes` must be given"
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # state hash => log-policy, from the least to the most recently used
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, keys, num_moves):
+        """Returns an array with the cached log-policy of each key (rows of missing keys are left undefined), and the mask of missing keys."""
+        log_policy = np.empty((len(keys), num_moves), dtype=np.float32)
+        missing = np.zeros(len(keys), dtype=bool)
+        for i, key in enumerate(keys.tolist()):
+            row = self.entries.get(key)
+            if row is None:
+                missing[i] = True
+            else:
+                self.entries.move_to_end(key)
+                log_policy[i] = row
+        num_missing = int(missing.sum())
+        self.hits += len(keys) - num_missing
+        self.misses += num_missing
+        return log_policy, missing
+
+    def store(self, keys, log_policy):
+        """Caches the log-policy of each key, then evicts the least recently used entries beyond the limits."""
+        for key, row in zip(keys.tolist(), np.asarray(log_policy, dtype=np.float32)):
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                continue
+            self.entries[key] = row.copy() # not a view, which would keep the whole batch alive
+            self.nbytes += row.nbytes + 8
+        while self.entries and (
+            (self.max_entries and len(self.entries) > self.max_entries) or (self.max_bytes and self.nbytes > self.max_bytes)
+        ):
+            _, row = self.entries.popitem(last=False)
+            self.nbytes -= row.nbytes + 8
+
+    @property
+    def hit_rate(self):
+        return self.hits / max(self.hits + self.misses, 1)
+
+    def clear(self):
+        """Empties the cache and resets its counters."""
+        self.entries.clear()
+        self.nbytes = self.hits = self.misses = 0
+
+
+def _transposition_keys(env, states, groups):
+    """
+    Hashes of states, salted with the index of the search each state belongs to.
+    4x4 states are hashed in their canonical orientation, as the reduction goal does not depend on orientation.
+    """
+    if hasattr(env, "batch_canonical_orientation"):
+        states = env.batch_canonical_orientation(states)[0]
+    return state_hashes(states) ^ (groups.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15))
+
+
+def _best_per_key(keys, scores):
+    """Indices of the best-scoring entry for each distinct key."""
+    order = np.lexsort((-scores, keys))
+    first = np.r_[True, keys[order][1:] != keys[order][:-1]]
+    return order[first]
+
+
+def _top_per_group(groups, scores, k):
+    """Indices of the `k` best-scoring entries of each group, sorted by group."""
+    order = np.lexsort((-scores, groups))
+    rank = np.arange(len(order)) - np.searchsorted(groups[order], groups[order])
+    return order[rank < k]
+
+
+def _top_per_group_device(scores, groups, k):
+    """Torch counterpart of `_top_per_group`, on the device of `scores`."""
+    order = torch.argsort(scores, descending=True, stable=True)
+    order = order[torch.argsort(groups[order], stable=True)]
+    sorted_groups = groups[order]
+    rank = torch.arange(len(order), device=scores.device) - torch.searchsorted(sorted_groups, sorted_groups)
+    return order[rank < k]
+
+
+def _allowed_after(env):
+    """Boolean matrix whose entry [i, j] tells if move `j` may follow move `i` (see `env.moves_ix_available_after`)."""
+    allowed_after = np.zeros((len(env.moves), len(env.moves)), dtype=bool)
+    for m, available_moves in env.moves_ix_available_after.items():
+        allowed_after[m, available_moves] = True
+    return allowed_after
+
+
+def _precision_context(device, precision):
+    """Autocast context for the given precision mode."""
+    if precision == "fp16":
+        return torch.cuda.amp.autocast(dtype=torch.float16)
+    elif precision == "bf16":
+        return torch.autocast(device_type=device.type, dtype=torch.bfloat16)
+    elif precision in ["fp32", "int8"]:
+        return nullcontext() # int8 models are quantized ahead of the search
+    raise ValueError(f"Invalid precision `{precision}`. Choose from: fp32, fp16, bf16, int8")
+
+
+def _log_policy(model, batch_x, device, batch_size=2**16):
+    """Log-softmax of the model output, left on `device` and evaluated in mini-batches so as to avoid 'CUDA out of memory' error."""
+    batch_logp = []
+    for i in range(0, len(batch_x), batch_size):
+        logits = model(torch.from_numpy(batch_x[i:i+batch_size]).to(device))
+        batch_logp.append(torch.nn.functional.log_softmax(logits.float(), dim=-1))
+    return torch.cat(batch_logp)
+
+
+def _cached_log_policy(model, states, device, cache, inference_order):
+    """`_log_policy` in move order, looked up in `cache` first; distinct states missing from it are evaluated together."""
+    keys = state_hashes(states)
+    log_policy, missing = cache.lookup(keys, len(inference_order))
+    if missing.any():
+        missing_keys, first, inverse = np.unique(keys[missing], return_index=True, return_inverse=True)
+        missing_policy = _log_policy(model, states[np.flatnonzero(missing)[first]], device)[:, inference_order].cpu().numpy()
+        log_policy[missing] = missing_policy[inverse.ravel()]
+        cache.store(missing_keys, missing_policy)
+    return torch.from_numpy(log_policy).to(device)
+
+
+def _backtrack(parents, moves, i):
+    """Rebuilds the path of move indices leading to the `i`-th candidate of the last depth."""
+    path = []
+    for parent, move in zip(reversed(parents), reversed(moves)):
+        path.append(move[i])
+        i = parent[i]
+    return path[::-1]
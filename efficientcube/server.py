@@ -0,0 +1,294 @@
+"""
+Local solve service: a long-lived asyncio HTTP (or Unix-socket) server around a single `EfficientCube`.
+
+Models are loaded once. Each request runs its beam search in a worker thread, and every model call of every in-flight
+request goes through a shared `BatchScheduler`, which merges the frontier states waiting on the same model into a single
+forward pass. A batch is evaluated as soon as it reaches `max_batch_size` rows, every running request is waiting on the
+model, or its oldest call has waited `max_wait` seconds.
+
+Endpoints:
+    POST /solve     {"scramble": "R U' Fw2 ...", "beam_width": 1024, "deadline": 10.0}  (`beam_width` and `deadline`,
+                    in seconds, are optional) => {"solution": "...", "length": ..., "num_nodes": ..., "time": ...}
+    GET  /metrics   queue depth, batch fill ratio, p50/p99 latency, ...
+
+Usage (from the repository root):
+    TQDM_DISABLE=1 python -m efficientcube.server --port 8000
+    curl -d '{"scramble": "R U F"}' localhost:8000/solve
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import numpy as np
+import torch
+from .search import _precision_context
+
+_request = threading.local() # deadline of the request handled by the current thread
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class BatchScheduler:
+    """
+    Merges concurrent calls to the same models into shared forward passes, evaluated by a dedicated thread.
+
+    Args:
+        device (torch.device): Device of the models and their inputs.
+        precision (str, optional): Precision mode of the models (see `search.beam_search_many`).
+        max_batch_size (int, optional): Maximum number of states per forward pass. A single larger call is evaluated alone.
+        max_wait (float, optional): Maximum time a call waits for others to join its batch, in seconds.
+    """
+    def __init__(self, device, precision="fp32", max_batch_size=2**14, max_wait=0.002):
+        self.device = device
+        self.precision = precision
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.cond = threading.Condition()
+        self.pending = [] # model calls waiting to be evaluated, oldest first
+        self.num_running = 0 # requests being solved
+        self.num_batches = 0
+        self.num_rows = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def wrap(self, model):
+        """A drop-in replacement for `model` whose calls are batched with those of other requests."""
+        return BatchedModel(self, model)
+
+    @contextmanager
+    def request(self, deadline=None):
+        """Marks the current thread as solving a request, whose model calls fail after `deadline` (a `time.perf_counter` value)."""
+        _request.deadline = deadline
+        with self.cond:
+            self.num_running += 1
+        try:
+            yield
+        finally:
+            _request.deadline = None
+            with self.cond:
+                self.num_running -= 1
+                self.cond.notify()
+
+    def submit(self, model, inputs):
+        """Evaluates `model` on `inputs` within the next batch, blocking until the output is ready."""
+        deadline = getattr(_request, "deadline", None)
+        if deadline is not None and time.perf_counter() > deadline:
+            raise DeadlineExceeded("Deadline exceeded")
+        call = _ModelCall(model, inputs)
+        with self.cond:
+            self.pending.append(call)
+            self.cond.notify()
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.output
+
+    @property
+    def fill_ratio(self):
+        """Mean number of rows per batch, relative to `max_batch_size`."""
+        return self.num_rows / max(self.num_batches, 1) / self.max_batch_size
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while True:
+                    if self.pending:
+                        model = self.pending[0].model
+                        calls = [call for call in self.pending if call.model is model]
+                        wait = self.pending[0].time + self.max_wait - time.perf_counter()
+                        if (
+                            sum(len(call.inputs) for call in calls) >= self.max_batch_size
+                            or len(self.pending) >= self.num_running # every request is waiting on a model
+                            or wait <= 0
+                        ):
+                            break
+                        self.cond.wait(wait)
+                    else:
+                        self.cond.wait()
+                batch, num_rows = [], 0
+                for call in calls:
+                    if batch and num_rows + len(call.inputs) > self.max_batch_size:
+                        break
+                    batch.append(call)
+                    num_rows += len(call.inputs)
+                self.pending = [call for call in self.pending if call not in batch]
+            self._evaluate(model, batch)
+            self.num_batches += 1
+            self.num_rows += num_rows
+
+    @torch.no_grad()
+    def _evaluate(self, model, batch):
+        try:
+            with _precision_context(self.device, self.precision): # autocast is thread-local
+                outputs = model(torch.cat([call.inputs for call in batch]))
+            outputs = torch.split(outputs, [len(call.inputs) for call in batch])
+        except Exception as e:
+            outputs = [None] * len(batch)
+            for call in batch:
+                call.error = e
+        for call, output in zip(batch, outputs):
+            call.output = output
+            call.done.set()
+
+
+class BatchedModel:
+    """Model proxy returned by `BatchScheduler.wrap`."""
+    def __init__(self, scheduler, model):
+        self.scheduler = scheduler
+        self.model = model
+
+    def __call__(self, inputs):
+        return self.scheduler.submit(self.model, inputs)
+
+    def eval(self):
+        return self
+
+
+class _ModelCall:
+    def __init__(self, model, inputs):
+        self.model = model
+        self.inputs = inputs
+        self.time = time.perf_counter()
+        self.done = threading.Event()
+        self.output = None
+        self.error = None
+
+
+class SolveServer:
+    """
+    Serves the solves of an `EfficientCube`, whose models (of both stages) are taken over by a `BatchScheduler`.
+
+    Args:
+        solver (EfficientCube): A solver without a policy cache, which is not shared across threads.
+        beam_width (int, optional): Beam width of the requests that do not specify one.
+        max_concurrency (int, optional): Maximum number of requests solved at once; others are queued.
+        Other arguments are those of `BatchScheduler`.
+    """
+    def __init__(self, solver, beam_width=2**13, max_batch_size=2**14, max_wait=0.002, max_concurrency=16):
+        assert solver.policy_cache is None, "The policy cache is not thread-safe"
+        self.solver = solver
+        self.beam_width = beam_width
+        self.scheduler = BatchScheduler(solver.device, solver.precision, max_batch_size, max_wait)
+        solver.model = self.scheduler.wrap(solver.model)
+        solver.verbose = False # no progress messages per request
+        if solver.env_name == '4x4':
+            solver.cube3_solver.model = self.scheduler.wrap(solver.cube3_solver.model)
+        self.executor = ThreadPoolExecutor(max_concurrency)
+        self.num_requests = 0 # received, not yet answered
+        self.num_solved = self.num_failed = 0
+        self.latencies = deque(maxlen=10000) # seconds, of the most recent requests
+
+    def solve(self, scramble, beam_width=None, deadline=None):
+        """Solves a scramble (blocking), failing with `DeadlineExceeded` after `deadline` seconds."""
+        deadline = time.perf_counter() + deadline if deadline is not None else None
+        with self.scheduler.request(deadline):
+            return self.solver.solve_many([scramble], beam_width or self.beam_width)[0]
+
+    def metrics(self):
+        latencies = np.array(self.latencies) if self.latencies else np.full(1, np.nan)
+        return {
+            "queue_depth": self.num_requests - self.scheduler.num_running, # requests waiting for a worker
+            "requests_in_flight": self.num_requests,
+            "pending_model_calls": len(self.scheduler.pending),
+            "num_solved": self.num_solved,
+            "num_failed": self.num_failed,
+            "num_batches": self.scheduler.num_batches,
+            "batch_fill_ratio": self.scheduler.fill_ratio,
+            "latency_p50": float(np.percentile(latencies, 50)),
+            "latency_p99": float(np.percentile(latencies, 99)),
+        }
+
+    async def handle(self, method, path, body):
+        """Routes an HTTP request, returning its status code and JSON payload."""
+        if method == "GET" and path == "/metrics":
+            return 200, self.metrics()
+        if method != "POST" or path != "/solve":
+            return 404, {"error": f"No route for {method} {path}"}
+        try:
+            request = json.loads(body)
+            scramble = request["scramble"]
+            scramble = scramble.split() if isinstance(scramble, str) else list(scramble)
+            for token in scramble:
+                self.solver.env.parse_token(token) # strict notation, checked before anything is compiled or cached
+        except Exception as e:
+            return 400, {"error": f"{type(e).__name__}: {e}"}
+
+        time_0 = time.perf_counter()
+        self.num_requests += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.solve, scramble, request.get("beam_width"), request.get("deadline"),
+            )
+        except DeadlineExceeded as e:
+            self.num_failed += 1
+            return 504, {"error": str(e)}
+        except Exception as e:
+            self.num_failed += 1
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            self.num_requests -= 1
+            self.latencies.append(time.perf_counter() - time_0)
+
+        if result is None:
+            self.num_failed += 1
+            return 200, {"solution": None}
+        self.num_solved += 1
+        return 200, {"solution": " ".join(result['solutions']), "length": len(result['solutions']), "num_nodes": result['num_nodes'], "time": result['times']}
+
+    async def _handle_connection(self, reader, writer):
+        """Minimal HTTP/1.1: one request per connection, with a `Content-Length` body."""
+        try:
+            method, path, _ = (await reader.readline()).decode().split()
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                key, value = line.decode().split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            status, payload = await self.handle(method, path, body)
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            status, payload = 400, {"error": f"Malformed request: {e}"}
+        content = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(content)}\r\nConnection: close\r\n\r\n".encode() + content
+        )
+        await writer.drain()
+        writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8000, unix_socket=None):
+        """Serves forever on `host:port`, or on the Unix socket at `unix_socket` if given."""
+        if unix_socket:
+            server = await asyncio.start_unix_server(self._handle_connection, unix_socket)
+        else:
+            server = await asyncio.start_server(self._handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error", 504: "Gateway Timeout"}
+
+
+if __name__=="__main__":
+    import argparse
+    from . import EfficientCube
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--unix-socket", default=None)
+    parser.add_argument("--env", default="4x4")
+    parser.add_argument("--beam-width", type=int, default=2**13)
+    parser.add_argument("--max-batch-size", type=int, default=2**14)
+    parser.add_argument("--max-wait-ms", type=float, default=2.)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--precision", default="fp32")
+    parser.add_argument("--endgame", default=None, help="Path of a saved 3x3 endgame table")
+    args = parser.parse_args()
+
+    solver = EfficientCube(env=args.env, precision=args.precision, endgame=args.endgame)
+    server = SolveServer(solver, args.beam_width, args.max_batch_size, args.max_wait_ms / 1000, args.max_concurrency)
+    print(f"Serving on {args.unix_socket or f'{args.host}:{args.port}'}")
+    asyncio.run(server.serve(args.host, args.port, args.unix_socket))
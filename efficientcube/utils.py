@@ -2,22 +2,47 @@ import numpy as np
 from .environments import *
 
 def convert_4x4_to_3x3(cube4):
-    index_map = {0:2, 1:5, 3:8, 4:1, 5:4, 7:7, 12:0, 13:3, 15:6, 16:20, 17:23, 19:26, 20:19, 21:22, 23:25, 28:18, 29:21, 31:24, 32:47, 33:50, 35:53, 36:46, 37:49, 39:52, 44:45, 45:48,
-                  47:51, 48:29, 49:32, 51:35, 52:28, 53:31, 55:34, 60:27, 61:30, 63:33, 64:38, 65:41, 67:44, 68:37, 69:40, 71:43, 76:36, 77:39, 79:42, 80:11, 81:14, 83:17, 84:10, 85:13,
-                  87:16, 92:9, 93:12, 95:15}
-    
-    color_map = {0:0, 1:2, 2:5, 3:3, 4:4, 5:1}
-
     cube3 = Cube3()
-
-    old_state = cube4.state
-    new_state = np.zeros(6*9)
-    for i in index_map.keys():
-        new_state[index_map[i]] = color_map[old_state[i]]
-    cube3.state = new_state
-
+    cube3.state = batch_convert_4x4_to_3x3(cube4.state[None, :])[0]
     return cube3
 
+def batch_convert_4x4_to_3x3(states):
+    """
+    `convert_4x4_to_3x3` on an (N, 96) array of reduced 4x4 states in the default orientation (see `Cube4.reset_rotation`),
+    returning an (N, 54) array of 3x3 states with a single gather and color lookup.
+    """
+    return _CONVERSION_COLORS[states[:, _CONVERSION_STICKERS]]
+
+# 4x4 sticker of each 3x3 sticker, and 3x3 color of each 4x4 color
+_index_map = {0:2, 1:5, 3:8, 4:1, 5:4, 7:7, 12:0, 13:3, 15:6, 16:20, 17:23, 19:26, 20:19, 21:22, 23:25, 28:18, 29:21, 31:24, 32:47, 33:50, 35:53, 36:46, 37:49, 39:52, 44:45, 45:48,
+              47:51, 48:29, 49:32, 51:35, 52:28, 53:31, 55:34, 60:27, 61:30, 63:33, 64:38, 65:41, 67:44, 68:37, 69:40, 71:43, 76:36, 77:39, 79:42, 80:11, 81:14, 83:17, 84:10, 85:13,
+              87:16, 92:9, 93:12, 95:15}
+_CONVERSION_STICKERS = np.array(sorted(_index_map, key=_index_map.get))
+_CONVERSION_COLORS = np.array([0, 2, 5, 3, 4, 1], dtype=np.uint8)
+
+_zobrist_tables = {}
+
+def state_hashes(states):
+    """64-bit Zobrist hashes of an (N, num_stickers) array of states whose colors range over 0..5."""
+    num_stickers = states.shape[-1]
+    if num_stickers not in _zobrist_tables:
+        _zobrist_tables[num_stickers] = np.random.default_rng(num_stickers).integers(0, 2**64, size=(num_stickers, 6), dtype=np.uint64)
+    return np.bitwise_xor.reduce(_zobrist_tables[num_stickers][np.arange(num_stickers), states], axis=-1)
+
+def pack_states(states):
+    """
+    Packs an (N, num_stickers) array of states (colors 0..5) into 3 bits per sticker, e.g. 36 bytes per 4x4 state.
+    Packed rows are exact, compact keys for storage and hashing.
+    """
+    bits = np.unpackbits(np.asarray(states, dtype=np.uint8)[..., None], axis=-1)[..., 5:]
+    return np.packbits(bits.reshape(*bits.shape[:-2], -1), axis=-1)
+
+def unpack_states(packed, num_stickers):
+    """Inverse of `pack_states`, returning uint8 states."""
+    bits = np.unpackbits(packed, axis=-1, count=num_stickers * 3)
+    bits = bits.reshape(*bits.shape[:-1], num_stickers, 3)
+    return (bits[..., 0] << 2) | (bits[..., 1] << 1) | bits[..., 2]
+
 def generate_simulator_link(scramble, solution):
     url = "https://alg.cubing.net/?puzzle=4x4x4"
 
@@ -4,7 +4,8 @@ if __name__ == '__main__':
 
     """ Specify scramble & search parameter """
     scramble = input("\nPaste scramble here:\n").split(' ')
-    beam_width = 2**13 # This parameter controls the trade-off between speed and quality
+    beam_widths = [2**k for k in range(10, 16)] # Tried in turn, widening only on failure (speed/quality trade-off)
+    timeout = 120 # Seconds, after which the search gives up
 
     """ Set up solver, apply scramble, & solve """
     solver = EfficientCube(
@@ -12,12 +13,13 @@ if __name__ == '__main__':
         model_path="auto",      # Automatically finds by `env` name
     )
     solver.apply_moves_to_env(scramble)
-    result = solver.solve(beam_width)
+    result = solver.solve(beam_widths, timeout=timeout)
 
     """ Verify the result """
     if result is not None:
         print('\nSolution:', ' '.join(result['solutions']))
         print('\nLength:', len(result['solutions']))
+        print('\nBeam width:', result['beam_width'])
         solver.reset_env()
         solver.apply_moves_to_env(scramble)
 
@@ -28,4 +30,4 @@ if __name__ == '__main__':
         print()
 
     else:
-        print('Failed — try a longer beam width.')
\ No newline at end of file
+        print(f'Failed — no solution within beam width {beam_widths[-1]} and {timeout}s.')
\ No newline at end of file
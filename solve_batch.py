@@ -0,0 +1,120 @@
+"""
+Batch counterpart of main.py: solves a stream of scrambles with a single `EfficientCube` (models loaded once),
+and writes one JSON result per line as soon as each (batch) is solved.
+
+Scrambles are read one per line from a file or stdin, either as plain moves (`R U' Fw2 ...`) or as JSON objects with a
+`scramble` field (a string or a list of moves) and an optional `id`. Lines are read lazily, so memory stays bounded on
+arbitrarily long inputs. A scramble that cannot be parsed or solved is recorded with an `error`, and the stream goes on.
+
+With `--resume`, an existing output file is appended to, skipping the input lines it already has results for.
+
+Usage (from the repository root):
+    python solve_batch.py scrambles.txt -o solutions.jsonl --beam-width 8192
+    cat scrambles.txt | python solve_batch.py --batch-size 16 > solutions.jsonl
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from efficientcube import EfficientCube
+
+def read_scrambles(lines):
+    """Yields (index, id, moves or exception) for each non-blank input line, in order."""
+    for index, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            if line.startswith("{"):
+                item = json.loads(line)
+                scramble = item["scramble"]
+                yield index, item.get("id"), scramble.split() if isinstance(scramble, str) else list(scramble)
+            else:
+                yield index, None, line.split()
+        except Exception as e:
+            yield index, None, e
+
+def last_index(path):
+    """
+    Index of the last input line that has a result in the output file at `path` (-1 if none),
+    and the size of the file without a trailing line cut short by an interrupted run.
+    """
+    index, size = -1, 0
+    with open(path, "rb") as f:
+        for line in f:
+            if line.endswith(b"\n"):
+                index, size = json.loads(line)["index"], size + len(line)
+    return index, size
+
+def solve_batch(solver, batch, beam_width):
+    """Solves a batch of (index, id, moves) items, yielding one record per item."""
+    time_0 = time.time()
+    try:
+        results = solver.solve_many([moves for _, _, moves in batch], beam_width)
+    except Exception as e:
+        if len(batch) > 1: # find out which scrambles fail
+            for item in batch:
+                yield from solve_batch(solver, [item], beam_width)
+            return
+        results = [e]
+    elapsed = time.time() - time_0
+    for (index, item_id, moves), result in zip(batch, results):
+        record = {"index": index, "id": item_id, "scramble": " ".join(moves)}
+        if isinstance(result, Exception):
+            record["error"] = f"{type(result).__name__}: {result}"
+        elif result is None:
+            record["solution"] = None
+        else:
+            record.update(solution=" ".join(result["solutions"]), length=len(result["solutions"]), num_nodes=result["num_nodes"], time=elapsed / len(batch))
+        yield record
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", nargs="?", default="-", help="File of scrambles, one per line (default: stdin)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file of results (default: stdout)")
+    parser.add_argument("--resume", action="store_true", help="Append to `--output`, skipping the scrambles it already has results for")
+    parser.add_argument("--env", default="4x4")
+    parser.add_argument("--beam-width", type=int, default=2**13)
+    parser.add_argument("--batch-size", type=int, default=1, help="Scrambles solved together, sharing model batches")
+    parser.add_argument("--precision", default="fp32")
+    parser.add_argument("--cache-size", type=int, default=0)
+    parser.add_argument("--endgame", default=None, help="Path of a saved 3x3 endgame table")
+    args = parser.parse_args()
+
+    start = 0
+    if args.resume:
+        assert args.output != "-", "--resume requires --output"
+        if os.path.exists(args.output):
+            index, size = last_index(args.output)
+            os.truncate(args.output, size)
+            start = index + 1
+        print(f"Resuming from input line {start}", file=sys.stderr)
+
+    solver = EfficientCube(env=args.env, precision=args.precision, cache_size=args.cache_size, endgame=args.endgame)
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    output_file = sys.stdout if args.output == "-" else open(args.output, "a" if args.resume else "w")
+    items = read_scrambles(itertools.islice(input_file, start, None))
+    num_done, num_solved, num_nodes, time_0 = 0, 0, 0, time.time()
+    while True:
+        batch = list(itertools.islice(items, args.batch_size))
+        if not batch:
+            break
+        records = [{"index": start + index, "id": item_id, "error": f"{type(moves).__name__}: {moves}"} for index, item_id, moves in batch if isinstance(moves, Exception)]
+        batch = [(start + index, item_id, moves) for index, item_id, moves in batch if not isinstance(moves, Exception)]
+        if batch:
+            with redirect_stdout(sys.stderr): # keep the progress messages of the search out of the results
+                records += list(solve_batch(solver, batch, args.beam_width))
+        for record in sorted(records, key=lambda record: record["index"]):
+            output_file.write(json.dumps(record) + "\n")
+            num_done += 1
+            num_solved += record.get("solution") is not None
+            num_nodes += record.get("num_nodes", 0)
+        output_file.flush()
+
+        elapsed = time.time() - time_0
+        print(f"{num_done} scrambles ({num_solved} solved) in {elapsed:.1f}s | {num_done / elapsed:.2f} scrambles/s | {num_nodes / elapsed:.0f} nodes/s", file=sys.stderr)